@@ -3,83 +3,54 @@ analysis.py
 Analyse boid‑flocking batch‑simulation results
 =============================================
 
- * Expects results.csv produced by experiments.py / batch_sim.py
+ * Reads the Parquet store produced by experiments.py (results/store),
+   falling back to a legacy results.csv
  * Computes Δ front and radial metrics vs. parameter change
  * Saves publication‑ready plots (PNG) without opening any GUI windows
 
+The work is split into stages that can be imported and called on their
+own:
+
+    load_results  → one tidy DataFrame (param_name, param_val, pct_change, …)
+    aggregate     → mean and bootstrap 95 % CI per (parameter, % change)
+    plot_combined / save_scatter → figures
+
+`run` chains them with an on‑disk cache (results/analysis_cache): every
+parameter's slice of the data is hashed, its aggregate is stored under
+that hash, and a figure is only re‑rendered when the hash of the data
+it shows has changed (or the PNG is missing).  Adding replicates of one
+parameter therefore re‑renders that parameter's scatter plots and the
+combined figure only.  The figures to re‑render are described as jobs
+and rendered in a process pool, one figure per worker at a time.
+
+    python analysis.py            # incremental
+    python analysis.py --force    # re‑render everything
+    python analysis.py --force --workers 4
+
 Author: ChatGPT‑refactor
 --------------------------------------------------------------------
 """
+import os, json, hashlib
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import matplotlib
 matplotlib.use("Agg")           # head‑less back‑end, no pop‑ups
 import matplotlib.pyplot as plt
-from scipy.stats import spearmanr
+from scipy.stats import spearmanr, t as student_t
+from results_store import STORE_DIR, read_trials
 
-# ------------------------------------------------------------------
-# 1. Load and sanity‑check the data
-# ------------------------------------------------------------------
 RESULTS_CSV = Path("results.csv")
-if not RESULTS_CSV.exists():
-    raise FileNotFoundError(
-        "results.csv not found – run experiments.py to generate it first."
-    )
-
-df = pd.read_csv(RESULTS_CSV)
-
-# Normalise column names if the script version changed
-col_map = {
-    "parameter": "param_name",
-    "param": "param_name",
-    "param_value": "param_val",
-    "value": "param_val",
-}
-df.rename(columns={old: new for old, new in col_map.items() if old in df.columns},
-          inplace=True)
-
-for needed in ["param_name", "param_val", "delta_front", "delta_radial"]:
-    if needed not in df.columns:
-        raise ValueError(f"Column '{needed}' is missing from results.csv")
+CACHE_DIR = Path("results") / "analysis_cache"
+NEEDED_COLUMNS = ["param_name", "param_value", "delta_front", "delta_radial"]
+METRICS = ("delta_front", "delta_radial")
 
-# ------------------------------------------------------------------
-# 2. Add percent‑change column (relative to default value)
-# ------------------------------------------------------------------
 DEFAULTS = {
     "MAX_SPEED": 3.0,
     "SEPARATION_RADIUS": 30.0,
     "COHESION_WEIGHT": 0.005,
 }
-def pct_change(row):
-    base = DEFAULTS.get(row["param_name"])
-    if base is None:
-        return np.nan
-    return 100.0 * (row["param_val"] - base) / base
-
-df["pct_change"] = df.apply(pct_change, axis=1)
-
-# ------------------------------------------------------------------
-# 3. Helper – line with 95 % CI (pure Matplotlib, safe for pandas 2.x)
-# ------------------------------------------------------------------
-def plot_mean_ci(ax, sub, xcol, ycol, label, color):
-    """Plot mean ± 95 % CI for each unique x value."""
-    sub = sub.dropna(subset=[xcol, ycol])
-    xs = np.sort(sub[xcol].unique())
-    means, lo, hi = [], [], []
-    for x in xs:
-        vals = sub.loc[sub[xcol] == x, ycol].to_numpy()
-        m = vals.mean()
-        if len(vals) > 1:
-            se = vals.std(ddof=1) / np.sqrt(len(vals))
-            ci95 = 1.96 * se
-        else:
-            ci95 = 0.0
-        means.append(m)
-        lo.append(m - ci95)
-        hi.append(m + ci95)
-    ax.plot(xs, means, marker="o", lw=1.8, color=color, label=label)
-    ax.fill_between(xs, lo, hi, color=color, alpha=0.20)
 
 # Colour cycle for parameters
 COLORS = dict(
@@ -88,35 +59,158 @@ COLORS = dict(
     COHESION_WEIGHT="#2ca02c",
 )
 
+
+# ------------------------------------------------------------------
+# 1. Load and sanity‑check the data
+# ------------------------------------------------------------------
+def load_results(store=STORE_DIR, csv=RESULTS_CSV):
+    """
+    All one‑at‑a‑time sweep trials as a DataFrame with ``param_name``,
+    ``param_val``, ``pct_change`` (relative to DEFAULTS) and the metrics.
+    """
+    if Path(store).exists():
+        # Parquet store written by experiments.py: read only what we plot,
+        # and only the one‑at‑a‑time sweep partitions
+        df = read_trials(store, columns=NEEDED_COLUMNS, params=list(DEFAULTS))
+    elif Path(csv).exists():
+        df = pd.read_csv(csv)                  # legacy single‑file results
+    else:
+        raise FileNotFoundError(
+            "No results found – run experiments.py to generate them first."
+        )
+
+    # Normalise column names if the script version changed
+    col_map = {
+        "parameter": "param_name",
+        "param": "param_name",
+        "param_value": "param_val",
+        "value": "param_val",
+    }
+    df = df.rename(columns={old: new for old, new in col_map.items()
+                            if old in df.columns})
+
+    for needed in ["param_name", "param_val", "delta_front", "delta_radial"]:
+        if needed not in df.columns:
+            raise ValueError(f"Column '{needed}' is missing from the results")
+
+    # 2. percent change relative to the default value; other parameters
+    #    (e.g. in a legacy CSV) have no default and are left out
+    base = df["param_name"].map(DEFAULTS)
+    df["pct_change"] = 100.0 * (df["param_val"] - base) / base
+    return df[base.notna()].reset_index(drop=True)
+
+
+def data_hash(df):
+    """Content hash of a DataFrame (independent of row order)."""
+    rows = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha1(np.sort(rows).tobytes()).hexdigest()[:16]
+
+
+# ------------------------------------------------------------------
+# 3. Aggregation – mean with bootstrap 95 % CI per x value
+# ------------------------------------------------------------------
+N_BOOT = 2000           # bootstrap resamples per group
+BOOT_SEED = 0
+BOOT_MAX_N = 5000       # larger groups: Student‑t interval (CLT holds there)
+BOOT_CHUNK = 4_000_000  # max resampled values held in memory at once
+
+
+def bootstrap_ci(vals, n_boot=N_BOOT, level=0.95, rng=None):
+    """
+    Percentile‑bootstrap CI of the mean of `vals`.
+
+    All resamples are drawn as one (n_boot, n) index matrix, so there is
+    no Python loop over resamples.  Unlike the normal approximation it
+    stays honest for the heavy‑tailed ``delta_front`` values of small
+    groups; groups above BOOT_MAX_N use the Student‑t interval, which is
+    accurate there and avoids an n_boot × n resample.
+    """
+    rng = np.random.default_rng(rng)
+    n = len(vals)
+    if n < 2:
+        return vals.mean(), vals.mean()
+    if n > BOOT_MAX_N:
+        half = student_t.ppf(0.5 + level / 2, n - 1) * vals.std(ddof=1) / np.sqrt(n)
+        return vals.mean() - half, vals.mean() + half
+    per_chunk = max(1, BOOT_CHUNK // n)
+    means = np.concatenate([
+        vals[rng.integers(0, n, (min(per_chunk, n_boot - i), n))].mean(axis=1)
+        for i in range(0, n_boot, per_chunk)])
+    alpha = (1 - level) / 2
+    return tuple(np.quantile(means, [alpha, 1 - alpha]))
+
+
+def mean_ci(sub, xcol, ycol, n_boot=N_BOOT, seed=BOOT_SEED):
+    """
+    Mean and bootstrap 95 % CI of `ycol` for each unique `xcol` value,
+    from a single sort / groupby pass over the rows.
+    """
+    sub = sub.dropna(subset=[xcol, ycol]).sort_values(xcol, kind="stable")
+    x = sub[xcol].to_numpy()
+    y = sub[ycol].to_numpy(dtype=float)
+    xs, starts, counts = np.unique(x, return_index=True, return_counts=True)
+    means = np.add.reduceat(y, starts) / counts if len(y) else np.array([])
+    rng = np.random.default_rng(seed)
+    bounds = np.array([bootstrap_ci(y[a:a + c], n_boot, rng=rng)
+                       for a, c in zip(starts, counts)]).reshape(-1, 2)
+    return pd.DataFrame(dict(x=xs, mean=means, lo=bounds[:, 0],
+                             hi=bounds[:, 1], n=counts))
+
+
+def aggregate(df, param):
+    """Aggregate table of one parameter: x, metric, mean, lo, hi."""
+    sub = df[df["param_name"] == param]
+    return pd.concat([mean_ci(sub, "pct_change", m).assign(metric=m)
+                      for m in METRICS], ignore_index=True)
+
+
+def cached_aggregate(df, param, digest, cache_dir=CACHE_DIR):
+    """`aggregate`, stored in `cache_dir` under the hash of its input."""
+    path = Path(cache_dir) / f"agg-{param}-{digest}-b{N_BOOT}s{BOOT_SEED}m{BOOT_MAX_N}.parquet"
+    if path.exists():
+        return pd.read_parquet(path)
+    agg = aggregate(df, param)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for old in path.parent.glob(f"agg-{param}-*.parquet"):
+        old.unlink()
+    agg.to_parquet(path, index=False)
+    return agg
+
+
 # ------------------------------------------------------------------
 # 4. Combined figure: Δ front & Δ radial vs. % change
 # ------------------------------------------------------------------
-fig, axes = plt.subplots(1, 2, figsize=(12, 4), sharex=True)
-for pname, sub in df.groupby("param_name"):
-    plot_mean_ci(
-        axes[0], sub, "pct_change", "delta_front",
-        label=pname.replace("_", " ").title(), color=COLORS.get(pname, None)
-    )
-    plot_mean_ci(
-        axes[1], sub, "pct_change", "delta_radial",
-        label=pname.replace("_", " ").title(), color=COLORS.get(pname, None)
-    )
-
-for ax, ylabel in zip(axes, ["Δ Front position (m)", "Δ Radial distance (m)"]):
-    ax.axhline(0, color="gray", lw=0.8, ls="--")
-    ax.set_xlabel("Parameter change (%)")
-    ax.set_ylabel(ylabel)
-    ax.legend(fontsize=8, frameon=False)
-fig.tight_layout()
-fig.savefig("combined_metrics.png", dpi=300)
-plt.close(fig)
-print("✓ combined_metrics.png written")
+def plot_mean_ci(ax, agg, label, color):
+    """Plot a `mean_ci` table as a line with its 95 % CI band."""
+    ax.plot(agg["x"], agg["mean"], marker="o", lw=1.8, color=color, label=label)
+    ax.fill_between(agg["x"], agg["lo"], agg["hi"], color=color, alpha=0.20)
+
+
+def plot_combined(aggs, fname="combined_metrics.png"):
+    """`aggs`: parameter → `aggregate` table."""
+    fig, axes = plt.subplots(1, 2, figsize=(12, 4), sharex=True)
+    for pname, agg in aggs.items():
+        for ax, metric in zip(axes, METRICS):
+            plot_mean_ci(ax, agg[agg["metric"] == metric],
+                         label=pname.replace("_", " ").title(),
+                         color=COLORS.get(pname, None))
+
+    for ax, ylabel in zip(axes, ["Δ Front position (m)", "Δ Radial distance (m)"]):
+        ax.axhline(0, color="gray", lw=0.8, ls="--")
+        ax.set_xlabel("Parameter change (%)")
+        ax.set_ylabel(ylabel)
+        ax.legend(fontsize=8, frameon=False)
+    fig.tight_layout()
+    fig.savefig(fname, dpi=300)
+    plt.close(fig)
+    print(f"✓ {fname} written")
+
 
 # ------------------------------------------------------------------
 # 5. Scatter + regression lines for each parameter separately
 # ------------------------------------------------------------------
-def save_scatter(param, metric, fname):
-    sub = df[df["param_name"] == param].dropna(subset=["pct_change", metric])
+def save_scatter(sub, param, metric, fname):
+    sub = sub.dropna(subset=["pct_change", metric])
     x = sub["pct_change"].to_numpy()
     y = sub[metric].to_numpy()
     rho, pval = spearmanr(x, y)
@@ -136,8 +230,81 @@ def save_scatter(param, metric, fname):
     plt.close(fig)
     print(f"✓ {fname} written")
 
-for param in df["param_name"].unique():
-    save_scatter(param, "delta_front",  f"{param}_front_scatter.png")
-    save_scatter(param, "delta_radial", f"{param}_radial_scatter.png")
 
-print("All analysis plots saved.")
+# ------------------------------------------------------------------
+# 6. Figure jobs, rendered in a process pool
+# ------------------------------------------------------------------
+# A job is a plain tuple (renderer name, output file, kwargs); the kwargs
+# hold only the slice of data that figure needs, so that is all a worker
+# process receives.
+RENDERERS = dict(scatter=save_scatter, combined=plot_combined)
+
+
+def render(job):
+    kind, fname, kwargs = job
+    RENDERERS[kind](fname=fname, **kwargs)
+    return fname
+
+
+def render_all(jobs, n_workers=None):
+    """
+    Render `jobs` on `n_workers` processes (default: one per core, at
+    most one per job).  Workers use the Agg backend set at import.
+    """
+    n_workers = min(n_workers or os.cpu_count() or 1, len(jobs))
+    if n_workers <= 1:
+        return [render(job) for job in jobs]
+    with ProcessPoolExecutor(n_workers) as pool:
+        return list(pool.map(render, jobs))
+
+
+# ------------------------------------------------------------------
+# 7. Incremental pipeline
+# ------------------------------------------------------------------
+def run(df=None, force=False, cache_dir=CACHE_DIR, n_workers=None):
+    """
+    Load (unless `df` is given), aggregate and plot, re‑rendering only
+    figures whose input data changed since the last run.
+
+    Returns the list of figures written.
+    """
+    df = load_results() if df is None else df
+    manifest_path = Path(cache_dir) / "figures.json"
+    manifest = {} if force or not manifest_path.exists() else \
+        json.loads(manifest_path.read_text())
+
+    def stale(fname, digest):
+        return manifest.get(fname) != digest or not Path(fname).exists()
+
+    jobs, new, aggs, digests = [], {}, {}, {}
+    for param, sub in df.groupby("param_name", sort=True):
+        digests[param] = data_hash(sub)
+        aggs[param] = cached_aggregate(sub, param, digests[param], cache_dir)
+        for metric, tag in (("delta_front", "front"), ("delta_radial", "radial")):
+            fname = f"{param}_{tag}_scatter.png"
+            if stale(fname, digests[param]):
+                jobs.append(("scatter", fname,
+                             dict(sub=sub[["pct_change", metric]],
+                                  param=param, metric=metric)))
+                new[fname] = digests[param]
+
+    combined = hashlib.sha1(json.dumps(digests, sort_keys=True).encode()).hexdigest()[:16]
+    if stale("combined_metrics.png", combined):
+        jobs.append(("combined", "combined_metrics.png", dict(aggs=aggs)))
+        new["combined_metrics.png"] = combined
+
+    written = render_all(jobs, n_workers)
+    manifest.update(new)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(json.dumps(manifest, indent=1))
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Plot the sweep results.")
+    ap.add_argument("--force", action="store_true", help="re‑render every figure")
+    ap.add_argument("--workers", type=int, help="render processes (default: cores)")
+    args = ap.parse_args()
+    written = run(force=args.force, n_workers=args.workers)
+    print(f"All analysis plots saved ({len(written)} re‑rendered).")
@@ -3,15 +3,23 @@
 Utility functions for running many simulations head‑less (no Pygame
 window) so that experiments.py can sweep parameter values efficiently.
 
-This module does **not** modify global `config` – every Boid is given its
-own parameter copy so that parallel runs stay independent.
+This module does **not** modify global `config` – every agent has its
+own parameter columns in the `engine.Flock` so that parallel runs stay
+independent.
 """
 
+import os, json, time, hashlib, traceback
+from pathlib import Path
 import numpy as np
+from scipy.stats import t as student_t
 import config
-from boids import Boid               # same Boid as in your main GUI version
-from directed_boids import DirectedBoid
-from hetero_boids import HeteroDirectedBoid
+from engine import Flock             # vectorised HeteroDirectedBoid rules
+from snapshots import snapshot_state, restore_state, save_state, load_state
+import registry
+from results_store import STORE_DIR, append_trials
+from trajectories import TrajectoryWriter
+from networks import GraphWriter
+from occupancy import OccupancyHistogram, save_histograms
 
 # ---------------------------------------------------------------------
 # helpers
@@ -30,9 +38,13 @@ def default_param_dict():
 # ---------------------------------------------------------------------
 # population initialisation
 # ---------------------------------------------------------------------
-def init_population(test_overrides, n_boids=config.NUM_BOIDS):
+# group 0 = the 10 % "selected" boids that receive the swept parameters
+GROUPS = ("selected", "nonselected")
+
+def init_population(test_overrides, n_boids=config.NUM_BOIDS, rng=None,
+                    interaction="metric", dtype=np.float64):
     """
-    Create a list of boid objects.
+    Create the flock for one trial.
 
     Parameters
     ----------
@@ -41,11 +53,19 @@ def init_population(test_overrides, n_boids=config.NUM_BOIDS):
         (the parameter we sweep), so we merge it with defaults first.
     n_boids : int
         Population size.
+    rng : np.random.Generator or int, optional
+        Random generator or seed for positions, headings and jitter.
+    interaction : str
+        Neighbour rule, see `engine.INTERACTIONS`.
+    dtype : np.dtype
+        State precision, see `engine.Flock` (float32 = compact mode).
 
     Returns
     -------
-    list[HeteroDirectedBoid]
+    engine.Flock
     """
+    rng = np.random.default_rng(rng)
+
     # 1. build the complete parameter set for *selected* boids
     params = default_param_dict()
     params.update(test_overrides)      # override the one we are sweeping
@@ -53,40 +73,168 @@ def init_population(test_overrides, n_boids=config.NUM_BOIDS):
     # 2. position everything in a random blob around the centre
     centre = np.array([config.WIDTH / 2, config.HEIGHT / 2], dtype=float)
     radius = 50
-    boids = []
-    for i in range(n_boids):
-        angle = np.random.rand() * 2 * np.pi
-        r     = np.random.rand() * radius
-        pos   = centre + r * np.array([np.cos(angle), np.sin(angle)])
-
-        # Mark 10 % as “selected” so they receive the modified params
-        selected = (i < max(1, int(0.1 * n_boids)))
-        if selected:
-            b = HeteroDirectedBoid(pos, goal=centre, selected=True)
-            # apply experimental parameters
-            b.max_speed         = params["MAX_SPEED"]
-            b.neighbor_radius   = params["NEIGHBOR_RADIUS"]
-            b.separation_radius = params["SEPARATION_RADIUS"]
-            b.ALIGNMENT_WEIGHT  = params["ALIGNMENT_WEIGHT"]
-            b.COHESION_WEIGHT   = params["COHESION_WEIGHT"]
-            b.SEPARATION_WEIGHT = params["SEPARATION_WEIGHT"]
-        else:
-            # ordinary boid with default settings
-            b = HeteroDirectedBoid(pos, goal=centre, selected=False)
-        boids.append(b)
+    angle = rng.random(n_boids) * 2 * np.pi
+    r     = rng.random(n_boids) * radius
+    positions = centre + r[:, None] * np.column_stack((np.cos(angle), np.sin(angle)))
+
+    # Mark 10 % as “selected” so they receive the modified params
+    n_selected = max(1, int(0.1 * n_boids))
+    group_ids = np.where(np.arange(n_boids) < n_selected, 0, 1)
+    flock = Flock(positions, group_ids, GROUPS, goal=centre, rng=rng,
+                  interaction=interaction, dtype=dtype)
+
+    # ordinary boids: individually varied parameters (as HeteroDirectedBoid)
+    n_other = n_boids - n_selected
+    flock.jitter_group_params("nonselected", default_param_dict())
+    flock.set_group_params("nonselected", TURNING_RATE=rng.uniform(
+        np.radians(10), np.radians(30), n_other))
 
-    return boids
+    # apply experimental parameters
+    apply_overrides(flock, params)
+    return flock
+
+
+def apply_overrides(flock, params):
+    """Set the parameters in `params` on every *selected* boid."""
+    flock.set_group_params("selected", **params)
+
+# ---------------------------------------------------------------------
+# warm start: cache of pre‑settled flocks
+# ---------------------------------------------------------------------
+WARM_START_DIR = Path("results") / "warm_start"
+# bump whenever the cached state format or the engine's dynamics change,
+# so stale cache files are not loaded
+SETTLED_STATE_VERSION = 2
+
+def settled_state(seed, n_boids=config.NUM_BOIDS, settle_steps=60,
+                  cache_dir=WARM_START_DIR, interaction="metric",
+                  dtype=np.float64):
+    """
+    Return the state of a flock that has settled for `settle_steps`
+    under the *baseline* parameters (see `snapshots.snapshot_state`).
+
+    The result only depends on the seed, the population size, the
+    settling time, the baseline values in config.py, the interaction
+    mode and the state precision (and the cache format version), so it
+    is cached on disk under a hash of exactly those and shared by every
+    sweep point that uses the same seed.
+    """
+    key = dict(version=SETTLED_STATE_VERSION, seed=seed, n_boids=n_boids,
+               settle_steps=settle_steps, params=default_param_dict(),
+               world=[config.WIDTH, config.HEIGHT], interaction=interaction,
+               dtype=np.dtype(dtype).name)
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    path = Path(cache_dir) / f"settled_{digest[:16]}.npz"
+    if path.exists():
+        return load_state(path)
+
+    flock = init_population({}, n_boids, rng=seed, interaction=interaction,
+                            dtype=dtype)
+    for _ in range(settle_steps):
+        flock.step()
+    state = snapshot_state(flock)
+
+    # write to a temp file first so concurrent workers never see half a file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as fh:
+        save_state(fh, state)
+    os.replace(tmp, path)
+    return state
+
+# ---------------------------------------------------------------------
+# stopping rules
+# ---------------------------------------------------------------------
+def batch_means_ci_width(series, n_batches=10, level=0.95):
+    """
+    Width of the confidence interval on the mean of an autocorrelated
+    time series, using the method of non‑overlapping batch means.
+
+    Consecutive steps of one trial are strongly correlated, so the naive
+    ``std / sqrt(n)`` badly underestimates the error.  Averaging over
+    `n_batches` contiguous blocks gives (nearly) independent samples.
+
+    Returns ``np.inf`` while there are fewer than two full batches.
+    """
+    series = np.asarray(series, dtype=float)
+    size = len(series) // n_batches
+    if n_batches < 2 or size < 1:
+        return np.inf
+    means = series[:size * n_batches].reshape(n_batches, size).mean(axis=1)
+    half = student_t.ppf(0.5 + level / 2, n_batches - 1) \
+        * means.std(ddof=1) / np.sqrt(n_batches)
+    return 2 * half
+
+
+def check_stopping(front_hist, rad_hist, dist_hist,
+                   ci_width=None, min_log_steps=300, n_batches=10,
+                   stall_window=None, stall_tol=1.0):
+    """
+    Evaluate the adaptive stopping rules for the current trial.
+
+    Parameters
+    ----------
+    front_hist, rad_hist : list[float]
+        Per‑step mean front / radial offset of the selected group
+        (only the logged steps).
+    dist_hist : list[float]
+        Per‑step centroid → target distance since the goal was issued.
+    ci_width : float or None
+        Stop once the batch‑means 95 % CI of *both* running estimates is
+        narrower than this (pixels).  ``None`` disables the rule.
+    min_log_steps : int
+        Never declare convergence on fewer logged steps than this.
+    stall_window : int or None
+        Stop when the centroid got less than `stall_tol` pixels closer
+        to the target over the last `stall_window` steps.  ``None``
+        disables the rule.
+
+    Returns
+    -------
+    str or None
+        ``"converged"``, ``"stalled"`` or ``None`` to keep running.
+    """
+    if ci_width is not None and len(front_hist) >= min_log_steps:
+        if (batch_means_ci_width(front_hist, n_batches) <= ci_width and
+                batch_means_ci_width(rad_hist, n_batches) <= ci_width):
+            return "converged"
+
+    if stall_window is not None and len(dist_hist) > stall_window:
+        progress = dist_hist[-stall_window - 1] - dist_hist[-1]
+        if progress < stall_tol:
+            return "stalled"
+
+    return None
 
 # ---------------------------------------------------------------------
 # single‑run wrapper (used by experiments.py)
 # ---------------------------------------------------------------------
+# occupancy histograms: grid, and half width (px) of the co‑moving window
+OCCUPANCY_BINS = (64, 64)
+COMOVING_HALF = 200.0
+OCCUPANCY_DIR = Path("results") / "occupancy"
+
 def run_single_sim(overrides,
                    target=np.array([config.WIDTH*0.8, config.HEIGHT*0.8]),
                    dt=1/60,
                    end_tol=10,
-                   max_steps=5000):
+                   max_steps=5000,
+                   ci_width=2.0,
+                   min_log_steps=300,
+                   stall_window=600,
+                   stall_tol=5.0,
+                   check_every=30,
+                   seed=None,
+                   warm_start=False,
+                   n_boids=config.NUM_BOIDS,
+                   log_every=1,
+                   record=None,
+                   graphs=None,
+                   graph_every=10,
+                   occupancy=None,
+                   dtype=np.float64):
     """
-    Run one simulation, return (delta_front, delta_radial) metrics.
+    Run one simulation, return (delta_front, delta_radial, info).
 
     Parameters
     ----------
@@ -100,60 +248,268 @@ def run_single_sim(overrides,
         Stop when group centroid is within this many pixels of `target`.
     max_steps : int
         Hard stop to avoid infinite loops.
+    ci_width, min_log_steps : float, int
+        Convergence rule, see `check_stopping`.  On by default;
+        ``ci_width=None`` disables it (the behaviour before these rules).
+    stall_window, stall_tol : int, float
+        Stall rule, see `check_stopping`.  On by default;
+        ``stall_window=None`` disables it.
+    check_every : int
+        Evaluate the convergence / stall rules every this many steps.
+    seed : int or None
+        Seed of the trial's random generator (``None`` = fresh entropy).
+    warm_start : bool
+        Start from the cached settled flock for `seed` (see
+        `settled_state`) instead of a fresh random blob.  The swept
+        parameters are only applied at goal‑issue time, and logging
+        starts immediately because the flock has already settled.
+    n_boids : int
+        Flock size (small values give cheap low‑fidelity runs).
+    log_every : int
+        Log the front / radial offsets only every this many steps
+        (coarse sampling); `min_log_steps` counts logged steps.
+    record : str, Path or None
+        Directory to record the full trajectory to (see
+        `trajectories.TrajectoryWriter`), for analysis after the fact.
+    graphs : str, Path or None
+        Directory to stream the neighbour graph of every `graph_every`‑th
+        step to (CSR, see `networks.GraphWriter`).
+    occupancy : str, Path or None
+        Save world‑frame and co‑moving occupancy histograms of both
+        groups, accumulated over the logged steps, to this ``.npz``
+        (see occupancy.py).
+    dtype : np.dtype
+        State precision (``np.float32`` = compact mode, see `engine.Flock`);
+        centroids and metrics are still accumulated in float64.
 
     Returns
     -------
-    tuple(float,float)
-        Mean ΔFront, ΔRadial of selected group between 1 s after
-        goal‑setting and arrival.
+    tuple(float,float,dict)
+        Mean ΔFront, ΔRadial of selected group between 1 s after
+        goal‑setting and the end of the trial, plus an info dict with
+        ``stop_reason`` ("goal", "converged", "stalled" or "max_steps"),
+        ``n_steps`` and the wall time of each phase (``t_init_s``,
+        ``t_step_s``, ``t_metrics_s``).
     """
-    boids = init_population(overrides)
+    t_start = time.perf_counter()
+    if warm_start:
+        if seed is None:
+            raise ValueError("warm_start needs a seed to pick the settled flock")
+        flock = restore_state(settled_state(seed, n_boids, dtype=dtype))
+        params = default_param_dict()
+        params.update(overrides)
+        apply_overrides(flock, params)      # fork to the swept value here
+        settle_time = 0.0
+    else:
+        flock = init_population(overrides, n_boids=n_boids, rng=seed, dtype=dtype)
+        settle_time = 1.0
+    selected = flock.group_mask("selected")
+    writer = None
+    if record is not None:
+        writer = TrajectoryWriter(record, flock.group_id, dtype=flock.dtype, dt=dt,
+                                  target=list(target), settle_time=settle_time,
+                                  log_every=log_every, seed=seed,
+                                  overrides=overrides,
+                                  world=[config.WIDTH, config.HEIGHT])
+    graph_writer = None if graphs is None else GraphWriter(graphs)
+    if occupancy is not None:
+        occ_world = OccupancyHistogram((0, config.WIDTH, 0, config.HEIGHT),
+                                       OCCUPANCY_BINS)
+        occ_comoving = OccupancyHistogram((-COMOVING_HALF, COMOVING_HALF,
+                                           -COMOVING_HALF, COMOVING_HALF),
+                                          OCCUPANCY_BINS)
 
-    # statistics containers
+    # statistics containers: one value per logged step
     sel_front = []
     sel_rad   = []
+    goal_dist = []
+
+    stop_reason = "max_steps"
+    t_init = time.perf_counter() - t_start
+    t_step = 0.0
 
     # step loop
     for step in range(max_steps):
         # issue goal at t=0
-        for b in boids:
-            b.goal = target
+        flock.set_goal(target)
 
         # update all
-        for b in boids:
-            b.update(boids)
+        t0 = time.perf_counter()
+        flock.step()
+        t_step += time.perf_counter() - t0
 
         # centroid of full group
-        positions = np.array([b.position for b in boids])
-        centroid  = positions.mean(axis=0)
+        positions = flock.position
+        if writer is not None:
+            writer.append(positions, flock.velocity)
+        if graph_writer is not None and step % graph_every == 0:
+            graph_writer.append(step, flock.neighbour_graph())
+        centroid  = positions.mean(axis=0, dtype=float)
 
         # vector pointing group → goal = "forward" direction
         forward   = (target - centroid)
         forward_norm = np.linalg.norm(forward)
+        goal_dist.append(forward_norm)
         if forward_norm < 1e-5:
             forward = np.array([0.0, 1.0])
         else:
             forward = forward / forward_norm
 
-        # log after 1 s to allow settling
-        if step * dt >= 1.0:
-            for b in boids:
-                if b.selected:
-                    rel = b.position - centroid
-                    # Front/back = projection on forward axis
-                    front = np.dot(rel, forward)
-                    # Radial distance = orthogonal magnitude
-                    radial = np.linalg.norm(rel - front*forward)
-                    sel_front.append(front)
-                    sel_rad  .append(radial)
+        # log after 1 s to allow settling (unless warm‑started)
+        if step * dt >= settle_time and step % log_every == 0:
+            rel = positions[selected] - centroid
+            # Front/back = projection on forward axis
+            front = rel @ forward
+            # Radial distance = orthogonal magnitude
+            radial = np.linalg.norm(rel - front[:, None] * forward, axis=1)
+            sel_front.append(front.mean())
+            sel_rad  .append(radial.mean())
+            if occupancy is not None:
+                rel_all = positions - centroid
+                lateral = rel_all @ np.array([-forward[1], forward[0]])
+                occ_world.add(positions, flock.group_id)
+                occ_comoving.add(np.column_stack((rel_all @ forward, lateral)),
+                                 flock.group_id)
 
         # termination: centroid reached goal
-        if np.linalg.norm(centroid - target) <= end_tol:
+        if forward_norm <= end_tol:
+            stop_reason = "goal"
             break
 
-    # convert to np.array to compute means
+        # termination: estimates converged or flock stopped progressing
+        if (step + 1) % check_every == 0:
+            reason = check_stopping(sel_front, sel_rad, goal_dist,
+                                    ci_width=ci_width,
+                                    min_log_steps=min_log_steps,
+                                    stall_window=stall_window,
+                                    stall_tol=stall_tol)
+            if reason is not None:
+                stop_reason = reason
+                break
+
+    # the selected group has a fixed size, so the mean of the per‑step
+    # means equals the mean over all logged (boid, step) samples
     sel_front = np.array(sel_front)
     sel_rad   = np.array(sel_rad)
 
+    if writer is not None:
+        writer.close(stop_reason=stop_reason, n_steps=step + 1)
+    if graph_writer is not None:
+        graph_writer.close()
+    if occupancy is not None:
+        save_histograms(occupancy, world=occ_world, comoving=occ_comoving)
+
+    t_total = time.perf_counter() - t_start
+    info = dict(stop_reason=stop_reason, n_steps=step + 1,
+                t_init_s=t_init, t_step_s=t_step,
+                t_metrics_s=t_total - t_init - t_step)
+
     # Δ is difference vs. un‑selected mean; for now just return group means
-    return sel_front.mean(), sel_rad.mean()
+    return sel_front.mean(), sel_rad.mean(), info
+
+
+# ---------------------------------------------------------------------
+# worker entry points: one sweep trial
+# ---------------------------------------------------------------------
+PHASES = ("t_init_s", "t_step_s", "t_metrics_s")
+
+def trial_row(param_name, value, seed, occupancy_dir=None, **sim_kwargs):
+    """
+    Run one sweep trial (only `param_name` differs from the defaults)
+    and return its result row, as stored by experiments.py.
+
+    With `occupancy_dir` the trial's occupancy histograms are saved
+    there and the row gets their path in ``occupancy_file``.
+    """
+    base = default_param_dict()[param_name]
+    extra = {}
+    if occupancy_dir is not None:
+        Path(occupancy_dir).mkdir(parents=True, exist_ok=True)
+        extra["occupancy_file"] = str(Path(occupancy_dir)
+                                      / f"{param_name}={value:.12g}-seed{seed}.npz")
+        sim_kwargs["occupancy"] = extra["occupancy_file"]
+    t0 = time.time()
+    d_front, d_radial, info = run_single_sim({param_name: value},
+                                             seed=seed, **sim_kwargs)
+    return dict(param_name = param_name,
+                param_value = float(value),
+                pct_change = 100 * (value - base) / base,
+                seed = int(seed),
+                delta_front = float(d_front),
+                delta_radial = float(d_radial),
+                run_time_s = time.time() - t0,
+                **info, **extra)
+
+
+def design_row(design_name, point_id, seed, overrides, **sim_kwargs):
+    """
+    Run one point of a multi‑parameter design (see design.py) and return
+    its result row: ``param_name`` is the design name, ``param_value``
+    the point id, and every parameter of the point gets its own column.
+    """
+    t0 = time.time()
+    d_front, d_radial, info = run_single_sim(overrides, seed=seed, **sim_kwargs)
+    return dict(param_name = design_name,
+                param_value = float(point_id),
+                seed = int(seed),
+                delta_front = float(d_front),
+                delta_radial = float(d_radial),
+                run_time_s = time.time() - t0,
+                **{k: float(v) for k, v in overrides.items()},
+                **info)
+
+
+def register_row(conn, row, worker=None):
+    """Record a finished `trial_row` in the registry as DONE."""
+    registry.record_trial(conn, row["param_name"], row["param_value"],
+                          row["seed"], registry.DONE,
+                          metrics={k: row[k] for k in registry.METRIC_COLUMNS},
+                          run_time_s=row["run_time_s"],
+                          phases={k[2:-2]: row[k] for k in PHASES},
+                          worker=worker)
+
+
+def run_trial(param_name, value, seed, registry_path=registry.REGISTRY_PATH,
+              overrides=None, run_meta=None, store=STORE_DIR, **sim_kwargs):
+    """
+    Run one sweep trial and record it in the SQLite registry.
+
+    With `overrides` (the full parameter set of a design point) the trial
+    is a `design_row` and `param_name` / `value` are the design name and
+    point id.
+
+    With `run_meta` (see `results_store.new_run_metadata`) the row is
+    appended to the Parquet `store` *before* the trial is marked DONE,
+    so an interrupted sweep never has registry‑done trials missing from
+    the store (which `registry.missing_trials` would skip on resume).
+
+    Safe to call from many worker processes at once: each call opens its
+    own connection and only writes two short transactions (start, end).
+
+    Returns
+    -------
+    dict or None
+        The result row, or ``None`` if the trial failed – the error is
+        stored in the registry.
+    """
+    conn = registry.connect(registry_path)
+    try:
+        registry.mark_running(conn, param_name, value, seed)
+        t0 = time.time()
+        try:
+            if overrides is None:
+                row = trial_row(param_name, value, seed, **sim_kwargs)
+            else:
+                row = design_row(param_name, value, seed, overrides, **sim_kwargs)
+            if run_meta is not None:
+                append_trials([row], run_meta, root=store)
+        except Exception:
+            registry.record_trial(conn, param_name, value, seed,
+                                  registry.FAILED,
+                                  run_time_s=time.time() - t0,
+                                  error=traceback.format_exc())
+            return None
+        register_row(conn, row)
+        return row
+    finally:
+        conn.close()
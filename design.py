@@ -0,0 +1,286 @@
+# design.py
+"""
+Space‑filling multi‑parameter sweeps and variance‑based sensitivity.
+
+experiments.py varies one parameter at a time.  Here a *design* samples
+any subset of the six parameters of `batch_sim.default_param_dict()`
+jointly:
+
+    sobol_design     scrambled Sobol' points
+    lhs_design       Latin hypercube
+    saltelli_design  Saltelli's A / B / AB_i scheme, from which
+                     `sobol_indices` estimates first‑order (S1) and total
+                     (ST) Sobol' indices of delta_front / delta_radial
+
+A design is a DataFrame with one row per point (``point_id`` plus one
+column per parameter).  `run_design` feeds it through the registry, the
+longest‑first process pool and the Parquet store exactly like the one‑
+at‑a‑time sweep: the design name plays the role of ``param_name`` and
+the point id that of ``param_value``.  With ``--queue`` the points are
+submitted to a shared `workqueue.DirectoryQueue` instead, for
+workqueue.py workers on other nodes.
+
+    python design.py saltelli --n 64 --params MAX_SPEED COHESION_WEIGHT --workers 4
+    python design.py sobol --n 256 --queue /shared/q
+    python design.py sobol --n 256 --sim-seed 1   # same points, new noise
+"""
+
+import json, hashlib, functools
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+from batch_sim import default_param_dict, run_trial
+import registry
+from results_store import new_run_metadata, read_trials
+from scheduler import run_longest_first, predict_costs, DEFAULT_COST
+from experiments import run_queued
+
+DESIGN_DIR = Path("results") / "designs"
+
+# default range of every parameter: ±50 % around config.py, as in experiments.py
+PARAM_SPACE = {name: (0.5 * value, 1.5 * value)
+               for name, value in default_param_dict().items()}
+
+
+# ------------------------------------------------------------------
+# designs
+# ------------------------------------------------------------------
+def _scale(unit, params, ranges):
+    ranges = {**PARAM_SPACE, **(ranges or {})}
+    lo = np.array([ranges[p][0] for p in params])
+    hi = np.array([ranges[p][1] for p in params])
+    return qmc.scale(unit, lo, hi)
+
+
+def _base2(n):
+    """Smallest m with 2**m >= n (Sobol' points balance only for 2**m)."""
+    return int(np.ceil(np.log2(max(n, 2))))
+
+
+def sobol_design(params, n, ranges=None, seed=0):
+    """Scrambled Sobol' design of ``2**ceil(log2 n)`` points."""
+    unit = qmc.Sobol(len(params), scramble=True, seed=seed).random_base2(_base2(n))
+    df = pd.DataFrame(_scale(unit, params, ranges), columns=list(params))
+    df.insert(0, "point_id", np.arange(len(df)))
+    return df
+
+
+def lhs_design(params, n, ranges=None, seed=0):
+    """Latin‑hypercube design of `n` points."""
+    unit = qmc.LatinHypercube(len(params), seed=seed).random(n)
+    df = pd.DataFrame(_scale(unit, params, ranges), columns=list(params))
+    df.insert(0, "point_id", np.arange(len(df)))
+    return df
+
+
+def saltelli_design(params, n, ranges=None, seed=0):
+    """
+    Saltelli sampling: base matrices A and B (``2**ceil(log2 n)`` rows
+    each, from one 2d‑dimensional Sobol' sequence) plus, for every
+    parameter i, AB_i = A with column i taken from B.  That is
+    ``n * (d + 2)`` simulations in total.
+
+    Extra columns: ``block`` ("A", "B" or the parameter name of AB_i)
+    and ``sample`` (row of the base matrices).
+    """
+    d = len(params)
+    unit = qmc.Sobol(2 * d, scramble=True, seed=seed).random_base2(_base2(n))
+    A, B = _scale(unit[:, :d], params, ranges), _scale(unit[:, d:], params, ranges)
+    blocks = [("A", A), ("B", B)]
+    for i, p in enumerate(params):
+        AB = A.copy()
+        AB[:, i] = B[:, i]
+        blocks.append((p, AB))
+
+    frames = []
+    for label, X in blocks:
+        df = pd.DataFrame(X, columns=list(params))
+        df.insert(0, "sample", np.arange(len(X)))
+        df.insert(0, "block", label)
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+    df.insert(0, "point_id", np.arange(len(df)))
+    return df
+
+
+def sobol_indices(design, y, n_boot=1000, seed=0):
+    """
+    First‑order and total Sobol' indices from a Saltelli design.
+
+    Estimators: Saltelli et al. (2010) for S1, Jansen (1999) for ST.
+    Confidence intervals (95 %) come from bootstrapping the base samples,
+    all resamples drawn at once as an index matrix.
+
+    Parameters
+    ----------
+    design : pd.DataFrame
+        Output of `saltelli_design`.
+    y : array_like
+        Model output per design row (same order as `design`).
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per parameter: S1, S1_lo, S1_hi, ST, ST_lo, ST_hi.
+
+    Raises
+    ------
+    ValueError
+        If `y` is missing (NaN) for any design row, e.g. points that
+        have not run yet: the estimators need complete blocks.
+    """
+    y = np.asarray(y, dtype=float)
+    missing = np.isnan(y)
+    if missing.any():
+        blocks = sorted(design["block"][missing].unique())
+        raise ValueError(f"{missing.sum()} of {len(y)} design points have no "
+                         f"result (blocks {', '.join(blocks)}); finish the "
+                         f"design before estimating Sobol' indices")
+    params = [b for b in design["block"].unique() if b not in ("A", "B")]
+    by_block = {b: y[(design["block"] == b).to_numpy()]
+                for b in ["A", "B"] + params}
+    fA, fB = by_block["A"], by_block["B"]
+    n = len(fA)
+
+    rng = np.random.default_rng(seed)
+    idx = np.vstack([np.arange(n), rng.integers(0, n, (n_boot, n))])
+    A, B = fA[idx], fB[idx]                       # (1 + n_boot, n)
+    var = np.concatenate([A, B], axis=1).var(axis=1)
+
+    rows = []
+    for p in params:
+        AB = by_block[p][idx]
+        s1 = np.mean(B * (AB - A), axis=1) / var
+        st = 0.5 * np.mean((A - AB) ** 2, axis=1) / var
+        rows.append(dict(param=p, S1=s1[0], ST=st[0],
+                         S1_lo=np.percentile(s1[1:], 2.5),
+                         S1_hi=np.percentile(s1[1:], 97.5),
+                         ST_lo=np.percentile(st[1:], 2.5),
+                         ST_hi=np.percentile(st[1:], 97.5)))
+    return pd.DataFrame(rows)[["param", "S1", "S1_lo", "S1_hi",
+                               "ST", "ST_lo", "ST_hi"]]
+
+
+# ------------------------------------------------------------------
+# storage and execution
+# ------------------------------------------------------------------
+def design_name(kind, n, params, ranges=None, seed=0):
+    """Short deterministic name, so re‑running a design resumes it."""
+    key = json.dumps([kind, n, list(params), ranges or {}, seed], sort_keys=True)
+    return f"{kind}{n}_{hashlib.sha1(key.encode()).hexdigest()[:8]}"
+
+
+def save_design(name, design):
+    DESIGN_DIR.mkdir(parents=True, exist_ok=True)
+    design.to_parquet(DESIGN_DIR / f"{name}.parquet", index=False)
+
+
+def load_design(name):
+    return pd.read_parquet(DESIGN_DIR / f"{name}.parquet")
+
+
+def _run_point(name, point_id, seed, points, **sim_kwargs):
+    return run_trial(name, point_id, seed, overrides=points[int(point_id)],
+                     **sim_kwargs)
+
+
+def design_costs(name, todo, points, history):
+    """
+    Predicted run time of the design trials `todo`: the observed median
+    for points already run (e.g. with another seed), otherwise the median
+    sweep trial scaled by every parameter's one‑at‑a‑time cost ratio
+    against its default (`scheduler.predict_costs` on the sweep history).
+    """
+    history = history.dropna(subset=["run_time_s"])
+    sweep = history[history["param_name"].isin(list(PARAM_SPACE))]
+    seen = history[history["param_name"] == name] \
+        .groupby("param_value")["run_time_s"].median()
+    defaults = default_param_dict()
+    costs = np.full(len(todo), float(sweep["run_time_s"].median())
+                    if len(sweep) else DEFAULT_COST)
+    for p in points[todo[0][1]] if todo else ():
+        at = predict_costs([(p, points[pid][p], s) for _, pid, s in todo], sweep)
+        base = predict_costs([(p, defaults[p], 0)], sweep)[0]
+        if base > 0:
+            costs *= at / base
+    for i, (_, pid, _) in enumerate(todo):
+        if float(pid) in seen.index:
+            costs[i] = seen[float(pid)]
+    return costs
+
+
+def run_design(name, design, n_workers=1, sim_seed=0, warm_start=True, queue=None):
+    """
+    Run every design point not yet done according to the registry, on
+    `n_workers` processes or on the shared `queue` directory, and append
+    the rows to the Parquet store (partition ``param_name=<name>``).
+
+    `sim_seed` seeds the simulations only; the points themselves come
+    from the design's own seed (see `design_name`), so the same design
+    can be replicated with other simulation seeds.
+    """
+    save_design(name, design)
+    params = [c for c in design.columns if c in PARAM_SPACE]
+    points = {int(r.point_id): {p: float(getattr(r, p)) for p in params}
+              for r in design.itertuples()}
+
+    conn = registry.connect()
+    todo = registry.missing_trials(conn, [(name, pid, sim_seed) for pid in points])
+    costs = design_costs(name, todo, points,
+                         registry.trial_table(conn, status=registry.DONE))
+    conn.close()
+    print(f"{name}: {len(points) - len(todo)} of {len(points)} points done, "
+          f"running {len(todo)}")
+
+    run_meta = new_run_metadata(design=name, sim_seed=sim_seed, warm_start=warm_start)
+    if queue:
+        run_queued(todo, run_meta, queue, points=points, warm_start=warm_start)
+        return
+    # every point is stored as it finishes, before the registry marks it done
+    fn = functools.partial(_run_point, points=points, run_meta=run_meta,
+                           warm_start=warm_start)
+    for _ in run_longest_first(todo, fn, costs, n_workers):
+        pass
+
+
+def design_results(name):
+    """Design table joined with its stored results (one row per point)."""
+    design = load_design(name)
+    res = read_trials(params=[name], columns=["param_value", "seed",
+                                              "delta_front", "delta_radial"])
+    res = res.rename(columns={"param_value": "point_id"})
+    res["point_id"] = res["point_id"].astype(int)
+    # several runs of the same point (e.g. other seeds) are averaged
+    res = res.groupby("point_id", as_index=False)[["delta_front",
+                                                   "delta_radial"]].mean()
+    return design.merge(res, on="point_id", how="left")
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Run a multi‑parameter design.")
+    ap.add_argument("kind", choices=["sobol", "lhs", "saltelli"])
+    ap.add_argument("--n", type=int, default=64)
+    ap.add_argument("--params", nargs="+", default=list(PARAM_SPACE),
+                    choices=list(PARAM_SPACE))
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--design-seed", type=int, default=0,
+                    help="scrambling / sampling seed of the design points")
+    ap.add_argument("--sim-seed", type=int, default=0,
+                    help="simulation seed of every point")
+    ap.add_argument("--queue", help="shared queue directory for workqueue.py workers")
+    args = ap.parse_args()
+
+    make = dict(sobol=sobol_design, lhs=lhs_design, saltelli=saltelli_design)
+    design = make[args.kind](args.params, args.n, seed=args.design_seed)
+    name = design_name(args.kind, args.n, args.params, seed=args.design_seed)
+    run_design(name, design, n_workers=args.workers, sim_seed=args.sim_seed,
+               queue=args.queue)
+
+    if args.kind == "saltelli":
+        res = design_results(name)
+        for metric in ("delta_front", "delta_radial"):
+            print(f"\nSobol' indices of {metric}")
+            print(sobol_indices(res, res[metric]).to_string(index=False,
+                                                            float_format="%.3f"))
@@ -0,0 +1,510 @@
+# distributed.py
+"""
+Domain‑decomposed multi‑process flock for very large populations.
+
+The wrap‑around world is cut into `n_workers` vertical slabs of equal
+width, one per worker process; each worker owns the agents whose x lies
+in its slab and steps them with an ordinary `engine.Flock`.  Per tick:
+
+    1. publish   every worker writes its agents within the halo width
+                 (the largest interaction radius) of either slab edge
+                 into shared memory
+    2. step      it reads the facing strips of its two neighbours and
+                 steps its own agents with those as ghost neighbours
+                 (``Flock.step(halo=...)``); it writes its partial sums
+                 (agent count, position sums of all / selected agents)
+    3. reduce    from the partial sums of all slabs every worker gets the
+                 global centroid and adds |lateral offset| of its selected
+                 agents, the one non‑linear term ``delta_radial`` needs
+    4. migrate   agents that left the slab are handed to the neighbouring
+                 slab through shared‑memory mailboxes; only migration
+                 wraps around (slab 0 ↔ the last slab), halos do not
+
+Two barriers per tick separate the phases; the main process only sends
+commands and reads the reductions, so the centroid and the metrics of
+`run_single_sim` cost O(n_workers) per tick, not O(N).  As in the
+single‑process engine, neighbourhoods do not reach across the world's
+wrap‑around edge, so both give the same dynamics up to summation order.
+
+Only the metric interaction without collective memory is supported, and
+every slab must be at least as wide as the halo.  Slabs have equal
+width, so throughput scales with the number of cores as long as the
+agents are spread over the world (``spread_population``); a single
+dense blob keeps one worker busy.
+
+    python distributed.py --n 1000000 --workers 1 2 4 8
+"""
+
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from threading import BrokenBarrierError
+import time
+import numpy as np
+import config
+from engine import Flock, PARAM_NAMES
+from batch_sim import init_population, apply_overrides, check_stopping, GROUPS
+from batch_sim import default_param_dict
+
+# one agent as a row of floats (migration mailboxes, gather)
+STATE = ("x", "y", "vx", "vy", "gx", "gy") + PARAM_NAMES + ("group", "id")
+HALO = ("x", "y", "vx", "vy")
+PARTIALS = ("n", "sx", "sy", "n_sel", "sx_sel", "sy_sel", "radial_sel")
+LEFT, RIGHT = 0, 1
+
+
+class _Shared:
+    """Named float64 views into one shared‑memory block."""
+
+    def __init__(self, n_slabs, capacity, batch, name=None):
+        self.layout = dict(n_slabs=n_slabs, capacity=capacity, batch=batch)
+        shapes = dict(halo=(n_slabs, 2, capacity, len(HALO)),
+                      halo_n=(n_slabs, 2),
+                      mail=(n_slabs, 2, capacity, len(STATE)),
+                      mail_n=(n_slabs, 2),
+                      partial=(n_slabs, batch, len(PARTIALS)))
+        size = sum(8 * int(np.prod(s)) for s in shapes.values())
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None,
+                                              size=size)
+        offset = 0
+        for key, shape in shapes.items():
+            view = np.ndarray(shape, dtype=np.float64, buffer=self.shm.buf,
+                              offset=offset)
+            setattr(self, key, view)
+            offset += view.nbytes
+
+    def close(self, unlink=False):
+        for key in ("halo", "halo_n", "mail", "mail_n", "partial"):
+            delattr(self, key)              # release the buffer views
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def to_rows(flock, ids, index=slice(None)):
+    """The agents `index` (default: all) of `flock` as `STATE` rows."""
+    return np.column_stack([flock.position[index], flock.velocity[index],
+                            flock.goal[index]]
+                           + [flock.params[name][index] for name in PARAM_NAMES]
+                           + [flock.group_id[index], ids[index]])
+
+
+def from_rows(rows, group_names, walls=None, dtype=np.float64, backend="numpy"):
+    """Inverse of `to_rows`: (Flock, ids)."""
+    flock = Flock(rows[:, 0:2], rows[:, -2].astype(int), group_names,
+                  goal=rows[:, 4:6], walls=walls, dtype=dtype, backend=backend)
+    flock.velocity = rows[:, 2:4].astype(flock.dtype)
+    for c, name in enumerate(PARAM_NAMES, start=6):
+        flock.params[name] = rows[:, c].astype(flock.dtype)
+    return flock, rows[:, -1].astype(np.int64)
+
+
+class _Agents:
+    """
+    The per‑agent arrays of a slab's `Flock` (and the agent ids) as
+    views of buffers with spare capacity, so migration changes them in
+    place at a cost that grows with the number of migrants, not with
+    the slab population.
+    """
+
+    def __init__(self, flock, ids):
+        self.flock, self.n = flock, flock.n
+        self.buffers = {}
+        self._reserve(self.n, dict(self._arrays(), ids=ids))
+        self.ids = self._bind()
+
+    def _arrays(self):
+        f = self.flock
+        return dict(position=f.position, velocity=f.velocity, goal=f.goal,
+                    group_id=f.group_id, **f.params)
+
+    def _reserve(self, size, arrays):
+        """Grow every buffer to ≥ `size` rows (doubling), keeping `arrays`."""
+        if self.buffers and size <= len(self.buffers["ids"]):
+            return
+        cap = max(2 * size, 1024)
+        for key, a in arrays.items():
+            buf = np.empty((cap,) + a.shape[1:], dtype=a.dtype)
+            buf[:self.n] = a[:self.n]
+            self.buffers[key] = buf
+
+    def _bind(self):
+        """Point the flock's arrays at the first `n` rows; return the ids."""
+        f, n, b = self.flock, self.n, self.buffers
+        f.position, f.velocity, f.goal = b["position"][:n], b["velocity"][:n], b["goal"][:n]
+        f.group_id = b["group_id"][:n]
+        for name in f.params:
+            f.params[name] = b[name][:n]
+        return b["ids"][:n]
+
+    def _write(self, index, rows):
+        """Store the `STATE` rows `rows` at agent positions `index`."""
+        b = self.buffers
+        b["position"][index] = rows[:, 0:2]
+        b["velocity"][index] = rows[:, 2:4]
+        b["goal"][index] = rows[:, 4:6]
+        for c, name in enumerate(PARAM_NAMES, start=6):
+            b[name][index] = rows[:, c]
+        b["group_id"][index] = rows[:, -2]
+        b["ids"][index] = rows[:, -1]
+
+    def migrate(self, leave, rows):
+        """
+        Drop the agents at the sorted indices `leave` and add the `STATE`
+        rows `rows`.  Arrivals fill the holes first; holes left over are
+        filled with agents moved from the tail, extra arrivals are
+        appended.  Agent order is not preserved (ids track identity).
+        """
+        n, m = self.n, self.n - len(leave) + len(rows)
+        filled = min(len(leave), len(rows))
+        self._write(leave[:filled], rows[:filled])
+        holes = leave[filled:]
+        if len(holes):
+            tail = np.arange(m, n)
+            movers = tail[~np.isin(tail, holes)]
+            targets = holes[holes < m]
+            for buf in self.buffers.values():
+                buf[targets] = buf[movers]
+        elif len(rows) > filled:
+            self._reserve(m, self.buffers)
+            self._write(slice(n, m), rows[filled:])
+        self.n = m
+        self.ids = self._bind()
+        return self.ids
+
+
+class _Slab:
+    """State and tick of one worker (runs inside the worker process)."""
+
+    def __init__(self, k, shared, halo_width, world, target, rows, flock_kwargs):
+        self.k, self.shared = k, shared
+        self.n_slabs = shared.layout["n_slabs"]
+        self.capacity = shared.layout["capacity"]
+        self.width = world[0] / self.n_slabs
+        self.x0, self.x1 = k * self.width, (k + 1) * self.width
+        self.halo_width = halo_width
+        self.target = np.asarray(target, dtype=float)
+        self.flock, ids = from_rows(rows, **flock_kwargs)
+        self.flock.width, self.flock.height = world
+        self.agents = _Agents(self.flock, ids)
+        self.ids = self.agents.ids
+
+    def _put(self, buffer, counts, side, rows, what):
+        if len(rows) > self.capacity:
+            raise RuntimeError(f"slab {self.k}: {len(rows)} {what} rows exceed the "
+                               f"buffer capacity {self.capacity}; raise `capacity`")
+        buffer[self.k, side, :len(rows)] = rows
+        counts[self.k, side] = len(rows)
+
+    def _take(self, buffer, counts, k, side):
+        return buffer[k, side, :int(counts[k, side])].copy()
+
+    def tick(self, t, barrier):
+        f, sh, K = self.flock, self.shared, self.n_slabs
+        left, right = (self.k - 1) % K, (self.k + 1) % K
+
+        # 1. publish the edge strips
+        x = f.position[:, 0]
+        for side, edge in ((LEFT, x < self.x0 + self.halo_width),
+                           (RIGHT, x >= self.x1 - self.halo_width)):
+            edge = np.flatnonzero(edge)
+            self._put(sh.halo, sh.halo_n, side,
+                      np.column_stack((f.position[edge], f.velocity[edge])), "halo")
+        barrier.wait()
+
+        # 2. step with the neighbours' strips (none across the world edge)
+        ghosts = []
+        if self.k > 0:
+            ghosts.append(self._take(sh.halo, sh.halo_n, self.k - 1, RIGHT))
+        if self.k < K - 1:
+            ghosts.append(self._take(sh.halo, sh.halo_n, self.k + 1, LEFT))
+        ghosts = np.concatenate(ghosts) if ghosts else np.zeros((0, len(HALO)))
+        if f.n:
+            f.step(halo=(ghosts[:, :2], ghosts[:, 2:]) if len(ghosts) else None)
+
+        pos = f.position
+        sel = f.group_id == 0
+        sh.partial[self.k, t, :6] = (len(pos), *pos.sum(axis=0, dtype=float),
+                                     sel.sum(), *pos[sel].sum(axis=0, dtype=float))
+        slab = np.minimum((pos[:, 0] // self.width).astype(int), K - 1)
+        go_left = slab == left
+        go_right = (slab == right) & ~go_left
+        keep = slab == self.k
+        if not np.all(keep | go_left | go_right):
+            raise RuntimeError(f"slab {self.k}: agents moved further than one slab")
+        if K > 1:
+            # only the migrants are copied into rows
+            leave = np.flatnonzero(~keep)
+            self._put(sh.mail, sh.mail_n, LEFT,
+                      to_rows(f, self.ids, leave[go_left[leave]]), "migration")
+            self._put(sh.mail, sh.mail_n, RIGHT,
+                      to_rows(f, self.ids, leave[go_right[leave]]), "migration")
+        barrier.wait()
+
+        # 3. |lateral offset| of the selected agents from the global centroid
+        total = sh.partial[:, t, :6].sum(axis=0)
+        centroid = total[1:3] / total[0]
+        forward = self.target - centroid
+        norm = np.linalg.norm(forward)
+        forward = np.array([0.0, 1.0]) if norm < 1e-5 else forward / norm
+        lateral = (pos[sel] - centroid) @ np.array([-forward[1], forward[0]])
+        sh.partial[self.k, t, 6] = np.abs(lateral).sum()
+
+        # 4. hand over the migrants
+        if K > 1:
+            arrived = np.concatenate((self._take(sh.mail, sh.mail_n, left, RIGHT),
+                                      self._take(sh.mail, sh.mail_n, right, LEFT)))
+            if len(arrived) or len(leave):
+                self.ids = self.agents.migrate(leave, arrived)
+
+
+def _worker(k, shm_name, layout, barrier, conn, halo_width, world, target,
+            flock_kwargs):
+    shared = _Shared(**layout, name=shm_name)
+    try:
+        slab = _Slab(k, shared, halo_width, world, target, conn.recv(), flock_kwargs)
+        while True:
+            cmd, arg = conn.recv()
+            if cmd == "run":
+                for t in range(arg):
+                    slab.tick(t, barrier)
+                conn.send(None)
+            elif cmd == "goal":
+                slab.target = np.asarray(arg, dtype=float)
+                slab.flock.set_goal(slab.target)
+                conn.send(None)
+            elif cmd == "gather":
+                conn.send(to_rows(slab.flock, slab.ids))
+            else:
+                break
+    except Exception as exc:                # unblock the others, report
+        barrier.abort()
+        conn.send(exc)
+    finally:
+        shared.close()
+
+
+class DistributedFlock:
+    """
+    A `Flock` stepped by `n_workers` processes, one slab each.
+
+    Parameters
+    ----------
+    flock : engine.Flock
+        Initial state (metric interaction, no collective memory); its
+        ``width`` × ``height`` is the world that is cut into slabs.
+    n_workers : int
+        Number of slabs / worker processes.
+    capacity : float
+        Rows of every halo and migration buffer, as a multiple of the
+        mean slab population (at least 1024).
+    batch : int
+        Most ticks per `run` call (size of the reduction buffer).
+    """
+
+    def __init__(self, flock, n_workers=4, capacity=1.0, batch=100):
+        if flock.interaction != "metric" or flock.memory_length:
+            raise ValueError("only the metric interaction without memory is supported")
+        world = (float(flock.width), float(flock.height))
+        self.halo_width = float(max(flock.params["NEIGHBOR_RADIUS"].max(),
+                                    flock.params["SEPARATION_RADIUS"].max()))
+        if world[0] / n_workers < self.halo_width:
+            raise ValueError(f"{n_workers} slabs are narrower than the halo "
+                             f"width {self.halo_width:g}")
+        self.n_workers, self.batch, self.n = n_workers, batch, flock.n
+        cap = max(1024, int(capacity * flock.n / n_workers))
+        self.shared = _Shared(n_workers, cap, batch)
+        barrier = mp.Barrier(n_workers)
+        self.flock_kwargs = flock_kwargs = dict(group_names=flock.group_names,
+                                                walls=flock.walls, dtype=flock.dtype,
+                                                backend=flock.backend)
+        self.target = flock.goal.mean(axis=0)
+
+        rows = to_rows(flock, np.arange(flock.n))
+        slab = np.minimum((flock.position[:, 0] // (world[0] / n_workers)).astype(int),
+                          n_workers - 1)
+        self.conns, self.procs = [], []
+        for k in range(n_workers):
+            here, there = mp.Pipe()
+            p = mp.Process(target=_worker, daemon=True,
+                           args=(k, self.shared.shm.name, self.shared.layout, barrier,
+                                 there, self.halo_width, world, self.target,
+                                 flock_kwargs))
+            p.start()
+            here.send(rows[slab == k])
+            self.conns.append(here)
+            self.procs.append(p)
+
+    def _all(self, cmd, arg=None):
+        for conn in self.conns:
+            conn.send((cmd, arg))
+        replies = [conn.recv() for conn in self.conns]
+        errors = [r for r in replies if isinstance(r, Exception)]
+        if errors:
+            # the failing worker's error, not the others' broken barrier
+            raise next((e for e in errors if not isinstance(e, BrokenBarrierError)),
+                       errors[0])
+        return replies
+
+    def set_goal(self, goal):
+        """Same goal for every agent."""
+        self.target = np.asarray(goal, dtype=float)
+        self._all("goal", self.target)
+
+    def run(self, n_ticks):
+        """
+        Advance `n_ticks` ticks; return the per‑tick reductions as a
+        (n_ticks, len(PARTIALS)) array summed over the slabs.
+        """
+        out = []
+        for start in range(0, n_ticks, self.batch):
+            ticks = min(self.batch, n_ticks - start)
+            self._all("run", ticks)
+            out.append(self.shared.partial[:, :ticks].sum(axis=0))
+        return np.concatenate(out) if out else np.zeros((0, len(PARTIALS)))
+
+    def gather(self):
+        """The whole flock as one `Flock`, agents in their original order."""
+        rows = np.concatenate(self._all("gather"))
+        rows = rows[np.argsort(rows[:, -1])]
+        flock, _ = from_rows(rows, **self.flock_kwargs)
+        return flock
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(("stop", None))
+            except OSError:                 # worker already gone
+                pass
+        for p in self.procs:
+            p.join()
+        self.shared.close(unlink=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def tick_metrics(partials, target):
+    """
+    Per‑tick centroid, centroid → target distance, and mean front and
+    radial offsets of the selected group (as in `run_single_sim`) from
+    the reductions returned by `DistributedFlock.run`.
+    """
+    n, sx, sy, n_sel, sx_sel, sy_sel, radial = partials.T
+    centroid = np.column_stack((sx, sy)) / n[:, None]
+    forward = target - centroid
+    dist = np.linalg.norm(forward, axis=1)
+    forward = np.where(dist[:, None] < 1e-5, [0.0, 1.0],
+                       forward / np.maximum(dist, 1e-300)[:, None])
+    sel_centroid = np.column_stack((sx_sel, sy_sel)) / n_sel[:, None]
+    front = np.einsum("ij,ij->i", sel_centroid - centroid, forward)
+    return centroid, dist, front, radial / n_sel
+
+
+def spread_population(test_overrides, n_boids, density=config.NUM_BOIDS, rng=None,
+                      dtype=np.float64):
+    """
+    `init_population` for large flocks: agents uniformly spread over a
+    world scaled so that a screen (WIDTH × HEIGHT) holds `density`
+    agents, heading for the world's centre.
+    """
+    rng = np.random.default_rng(rng)
+    side = np.sqrt(n_boids / density) * np.array([config.WIDTH, config.HEIGHT])
+    n_selected = max(1, int(0.1 * n_boids))
+    group_ids = np.where(np.arange(n_boids) < n_selected, 0, 1)
+    flock = Flock(rng.random((n_boids, 2)) * side, group_ids, GROUPS,
+                  goal=side / 2, rng=rng, dtype=dtype)
+    flock.width, flock.height = side
+    flock.jitter_group_params("nonselected", default_param_dict())
+    flock.set_group_params("nonselected", TURNING_RATE=rng.uniform(
+        np.radians(10), np.radians(30), n_boids - n_selected))
+    params = default_param_dict()
+    params.update(test_overrides)
+    apply_overrides(flock, params)
+    return flock
+
+
+def run_distributed_sim(overrides,
+                        target=np.array([config.WIDTH*0.8, config.HEIGHT*0.8]),
+                        n_workers=4,
+                        dt=1/60,
+                        end_tol=10,
+                        max_steps=5000,
+                        ci_width=2.0,
+                        min_log_steps=300,
+                        stall_window=600,
+                        stall_tol=5.0,
+                        check_every=30,
+                        seed=None,
+                        n_boids=config.NUM_BOIDS,
+                        log_every=1,
+                        flock=None):
+    """
+    `run_single_sim` on a `DistributedFlock`: same stopping rules and
+    return value (delta_front, delta_radial, info).  The rules are
+    evaluated after every batch of `check_every` ticks; a "goal" stop
+    uses the metrics up to the tick the goal was reached.
+
+    `flock` replaces the default `init_population` start (e.g. a
+    `spread_population` flock; `target` is then in its world).
+    """
+    t_start = time.perf_counter()
+    if flock is None:
+        flock = init_population(overrides, n_boids=n_boids, rng=seed)
+    flock.set_goal(target)
+    settle_time = 1.0
+    sel_front, sel_rad, goal_dist = [], [], []
+    stop_reason = "max_steps"
+    n_steps = 0
+    t_step = 0.0
+    with DistributedFlock(flock, n_workers, batch=check_every) as dist:
+        t_init = time.perf_counter() - t_start
+        while n_steps < max_steps:
+            ticks = min(check_every, max_steps - n_steps)
+            t0 = time.perf_counter()
+            partials = dist.run(ticks)
+            t_step += time.perf_counter() - t0
+            _, d, front, radial = tick_metrics(partials, target)
+            steps = n_steps + np.arange(ticks)
+            reached = np.flatnonzero(d <= end_tol)
+            last = reached[0] + 1 if len(reached) else ticks
+            log = (steps[:last] * dt >= settle_time) & (steps[:last] % log_every == 0)
+            goal_dist.extend(d[:last])
+            sel_front.extend(front[:last][log])
+            sel_rad.extend(radial[:last][log])
+            n_steps += last
+            if len(reached):
+                stop_reason = "goal"
+                break
+            reason = check_stopping(sel_front, sel_rad, goal_dist,
+                                    ci_width=ci_width, min_log_steps=min_log_steps,
+                                    stall_window=stall_window, stall_tol=stall_tol)
+            if reason is not None:
+                stop_reason = reason
+                break
+
+    t_total = time.perf_counter() - t_start
+    info = dict(stop_reason=stop_reason, n_steps=int(n_steps), n_workers=n_workers,
+                t_init_s=t_init, t_step_s=t_step,
+                t_metrics_s=t_total - t_init - t_step)
+    return np.mean(sel_front), np.mean(sel_rad), info
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Throughput of the distributed flock")
+    ap.add_argument("--n", type=int, default=1_000_000)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--ticks", type=int, default=20)
+    args = ap.parse_args()
+    start = spread_population({}, args.n, rng=0)
+    for n_workers in args.workers:
+        with DistributedFlock(start, n_workers) as dist:
+            dist.run(1)                     # warm up
+            t0 = time.perf_counter()
+            dist.run(args.ticks)
+            sec = (time.perf_counter() - t0) / args.ticks
+        print(f"n={args.n}  workers={n_workers}: {sec:.3f} s/tick, "
+              f"{args.n / sec / 1e6:.2f} M agent‑steps/s")
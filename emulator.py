@@ -0,0 +1,224 @@
+# emulator.py
+"""
+Gaussian‑process emulator of the sweep metrics.
+
+Answers "what is ΔFront at COHESION_WEIGHT = 0.0062?" from the results
+already in the Parquet store instead of running new trials:
+
+    python emulator.py COHESION_WEIGHT=0.0062
+    python emulator.py MAX_SPEED=3.6 SEPARATION_RADIUS=20 --metric delta_radial
+    python emulator.py --suggest 10     # where real trials would help most
+
+Every stored trial – one‑at‑a‑time sweep rows as well as design.py
+points – is a point in the six‑dimensional parameter space of
+`batch_sim.default_param_dict()` (parameters not varied by a trial are
+at their default).  Inputs are scaled by the defaults, replicates of the
+same point are averaged (their count lowers that point's noise), and a
+GP with an anisotropic squared‑exponential kernel plus noise is fitted
+by maximising the marginal likelihood.  After that a batch of queries is
+two matrix products, i.e. milliseconds.
+
+The fitted emulator is cached in results/emulator/<metric>.npz together
+with a hash of the training data, so it is only refitted when the store
+changes.
+"""
+
+import json, hashlib
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+from scipy.stats import qmc
+from batch_sim import default_param_dict
+from results_store import STORE_DIR, read_trials
+
+EMULATOR_DIR = Path("results") / "emulator"
+METRICS = ("delta_front", "delta_radial")
+
+
+def training_data(df, metric):
+    """
+    Parameter matrix (one row per distinct point, scaled by the
+    defaults), mean of `metric` and number of replicates per point.
+    """
+    defaults = default_param_dict()
+    names = list(defaults)
+    X = pd.DataFrame({p: np.full(len(df), v, dtype=float)
+                      for p, v in defaults.items()}, index=df.index)
+    # design rows carry one column per parameter …
+    for p in names:
+        if p in df:
+            X[p] = df[p].fillna(X[p])
+    # … one‑at‑a‑time rows only name the swept one
+    oat = df["param_name"].isin(names)
+    for p in names:
+        rows = oat & (df["param_name"] == p)
+        X.loc[rows, p] = df.loc[rows, "param_value"].astype(float)
+
+    X = X / pd.Series(defaults)
+    keys = X.round(12)
+    y = df[metric].astype(float)
+    ok = y.notna().to_numpy()
+    grouped = pd.concat([keys[ok], y[ok]], axis=1).groupby(names)[metric]
+    stats = grouped.agg(["mean", "size"]).reset_index()
+    return (stats[names].to_numpy(), stats["mean"].to_numpy(),
+            stats["size"].to_numpy())
+
+
+def _kernel(A, B, lengthscales, signal_var):
+    d = (A[:, None, :] - B[None, :, :]) / lengthscales
+    return signal_var * np.exp(-0.5 * np.sum(d * d, axis=-1))
+
+
+class Emulator:
+    """
+    GP emulator of one metric.
+
+    Parameters
+    ----------
+    X : np.ndarray, shape (n, d)
+        Distinct training points (parameters scaled by their defaults).
+    y : np.ndarray, shape (n,)
+        Mean metric per point.
+    counts : np.ndarray, shape (n,)
+        Replicates behind every mean (the noise variance is divided by it).
+    """
+
+    def __init__(self, X, y, counts, params=None):
+        self.X = np.asarray(X, dtype=float)
+        self.counts = np.asarray(counts, dtype=float)
+        self.y_mean = float(np.mean(y))
+        self.y_std = float(np.std(y)) or 1.0
+        self.z = (np.asarray(y, dtype=float) - self.y_mean) / self.y_std
+        self.params = params                # log lengthscales, log var, log noise
+        if self.params is None:
+            self.params = self._fit()
+        self._factorise()
+
+    # -- fitting -------------------------------------------------------
+    def _unpack(self, theta):
+        d = self.X.shape[1]
+        return np.exp(theta[:d]), np.exp(theta[d]), np.exp(theta[d + 1])
+
+    def _neg_log_likelihood(self, theta):
+        ls, var, noise = self._unpack(theta)
+        K = _kernel(self.X, self.X, ls, var)
+        K[np.diag_indices_from(K)] += noise / self.counts + 1e-8
+        try:
+            c = cho_factor(K, lower=True)
+        except np.linalg.LinAlgError:
+            return 1e10
+        alpha = cho_solve(c, self.z)
+        return 0.5 * self.z @ alpha + np.sum(np.log(np.diag(c[0])))
+
+    def _fit(self):
+        d = self.X.shape[1]
+        # start at the spread of each input (1 for inputs never varied:
+        # the likelihood is flat in those and they stay there)
+        spread = np.ptp(self.X, axis=0)
+        theta0 = np.concatenate([np.log(np.where(spread > 0, spread, 1.0)),
+                                 [0.0, np.log(0.1)]])
+        # lengthscales below the sweep's 10 % grid spacing would just
+        # interpolate seed noise
+        bounds = [(np.log(0.05), np.log(1e2))] * d + [(-5, 5), (-7, 2)]
+        res = minimize(self._neg_log_likelihood, theta0, method="L-BFGS-B",
+                       bounds=bounds)
+        return res.x
+
+    def _factorise(self):
+        ls, var, noise = self._unpack(self.params)
+        K = _kernel(self.X, self.X, ls, var)
+        K[np.diag_indices_from(K)] += noise / self.counts + 1e-8
+        self._chol = cho_factor(K, lower=True)
+        self._alpha = cho_solve(self._chol, self.z)
+
+    # -- prediction ----------------------------------------------------
+    def predict(self, Xq):
+        """
+        Predictive mean and standard deviation of the metric (of its
+        mean over seeds) at the scaled points `Xq` (shape (m, d)).
+        """
+        Xq = np.atleast_2d(np.asarray(Xq, dtype=float))
+        ls, var, _ = self._unpack(self.params)
+        Ks = _kernel(Xq, self.X, ls, var)
+        mean = Ks @ self._alpha
+        v = cho_solve(self._chol, Ks.T)
+        sd = np.sqrt(np.maximum(var - np.sum(Ks * v.T, axis=1), 0.0))
+        return self.y_mean + self.y_std * mean, self.y_std * sd
+
+    def query(self, points):
+        """
+        Predict at parameter dicts / a DataFrame in natural units; missing
+        parameters are at their default.  Returns a DataFrame with the
+        parameters plus ``mean`` and ``sd``.
+        """
+        defaults = default_param_dict()
+        q = pd.DataFrame(points if not isinstance(points, dict) else [points])
+        for p, v in defaults.items():
+            q[p] = q[p].astype(float) if p in q else v
+        scale = np.array(list(defaults.values()))
+        mean, sd = self.predict(q[list(defaults)].to_numpy() / scale)
+        return q[list(defaults)].assign(mean=mean, sd=sd)
+
+    def uncertain_points(self, n=10, n_candidates=4096, rel=0.5, seed=0):
+        """
+        Candidate parameter sets (Sobol' points within ±`rel` of the
+        defaults) where the predictive sd is largest – the places where
+        real trials would teach the emulator most.
+        """
+        defaults = default_param_dict()
+        unit = qmc.Sobol(len(defaults), seed=seed).random(n_candidates)
+        Xc = 1 - rel + 2 * rel * unit
+        mean, sd = self.predict(Xc)
+        top = np.argsort(-sd)[:n]
+        out = pd.DataFrame(Xc[top] * np.array(list(defaults.values())),
+                           columns=list(defaults))
+        return out.assign(mean=mean[top], sd=sd[top])
+
+    # -- persistence ---------------------------------------------------
+    def save(self, path, data_hash=""):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, X=self.X, y=self.y_mean + self.y_std * self.z,
+                 counts=self.counts, params=self.params,
+                 data_hash=np.array(data_hash))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            return cls(f["X"], f["y"], f["counts"], f["params"]), str(f["data_hash"])
+
+
+def load_emulator(metric="delta_front", root=STORE_DIR, cache_dir=EMULATOR_DIR):
+    """Emulator of `metric` fitted on the store, refitted only if it changed."""
+    df = read_trials(root)
+    X, y, counts = training_data(df, metric)
+    data_hash = hashlib.sha1(np.concatenate([X.ravel(), y, counts]).tobytes()).hexdigest()
+    path = Path(cache_dir) / f"{metric}.npz"
+    if path.exists():
+        emu, cached = Emulator.load(path)
+        if cached == data_hash:
+            return emu
+    emu = Emulator(X, y, counts)
+    emu.save(path, data_hash)
+    return emu
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Predict sweep metrics without simulating.")
+    ap.add_argument("query", nargs="*", help="NAME=value, other parameters at default")
+    ap.add_argument("--metric", choices=METRICS, nargs="+", default=list(METRICS))
+    ap.add_argument("--suggest", type=int, default=0,
+                    help="list the N most uncertain parameter sets")
+    args = ap.parse_args()
+
+    point = {k: float(v) for k, v in (q.split("=") for q in args.query)}
+    for metric in args.metric:
+        emu = load_emulator(metric)
+        res = emu.query(point).iloc[0]
+        print(f"{metric}: {res['mean']:+.2f} ± {1.96 * res['sd']:.2f} (95 %)  "
+              f"at {json.dumps(point) if point else 'defaults'}")
+        if args.suggest:
+            print(emu.uncertain_points(args.suggest).to_string(
+                index=False, float_format="%.4g"))
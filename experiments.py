@@ -10,18 +10,51 @@ varying each from –50 % to +50 % (10 % step) relative to the
     - delta_front  : mean front/back shift of the selected group
     - delta_radial : mean radial shift of the selected group
     - run_time_s   : how long the trial lasted until centroid ≈ goal
+    - stop_reason  : why the trial ended (goal / converged / stalled /
+                     max_steps), see batch_sim.check_stopping
+    - n_steps      : number of simulation steps actually run
 
-and writes one line per trial to results/experiment_metrics.csv
-with *consistent* column names that all plotting scripts will use.
+and appends one row per trial to the Parquet store in results/store
+(see results_store.py, partitioned by param_name) with *consistent*
+column names that all plotting scripts will use.
+
+Every trial is also recorded in the SQLite registry
+(results/registry.sqlite, see registry.py); trials it already lists as
+done are skipped, so an interrupted sweep resumes where it stopped.
+A row is stored as soon as its trial finishes and before the
+registry marks it done, so a done trial is always in the store.
+
+Trials end at the goal *or* by the convergence / stall rules of
+batch_sim.run_single_sim, which are on by default (ci_width=2.0,
+stall_window=600).  Earlier sweeps ran every trial until the goal or
+max_steps, so their delta_front / delta_radial are averaged over
+longer runs and are not directly comparable; pass ``ci_width=None,
+stall_window=None`` to `run_trial` to reproduce them.
+
+With ``--adaptive`` every sweep point first gets INITIAL_REPLICATES
+seeds; then every round gives each point whose 95 % CI on delta_front /
+delta_radial is still wider than TARGET_CI the replicates it is
+predicted to need (at most ROUND_MAX_EXTRA), widest first, until all
+points meet the target or REPLICATE_BUDGET trials are spent.
+
+Usage:
+    python experiments.py                    # run locally
+    python experiments.py --workers 8        # local pool, longest first
+    python experiments.py --queue /shared/q  # farm out to workqueue.py
+                                             # workers on other nodes
+    python experiments.py --adaptive --workers 8
 """
 
 import numpy as np
-import pandas as pd
-from pathlib import Path
-import itertools, time
+import functools, time
+from scipy.stats import t as student_t
 # ----------  your simulation imports  -------------
 import config
-from batch_sim import run_single_sim      # helper we wrote below
+from batch_sim import run_trial, register_row   # helpers we wrote below
+import registry
+from workqueue import DirectoryQueue, task_id
+from scheduler import predict_costs, estimate_makespan, run_longest_first
+from results_store import append_trials, new_run_metadata
 # ---------------------------------------------------
 
 # ------------------------------------------------------------------
@@ -34,44 +67,254 @@ DEFAULTS = dict(MAX_SPEED=config.MAX_SPEED,
                 SEPARATION_RADIUS=config.SEPARATION_RADIUS,
                 COHESION_WEIGHT=config.COHESION_WEIGHT)
 
+# every sweep point forks from the same pre‑settled flock (see
+# batch_sim.settled_state), so they only differ by the swept parameter
+SEED = 0
+WARM_START = True
+
 PARAM_RANGE = {
     "MAX_SPEED"        : DEFAULTS["MAX_SPEED"]        * (1 + pct_range()),
     "SEPARATION_RADIUS": DEFAULTS["SEPARATION_RADIUS"]* (1 + pct_range()),
     "COHESION_WEIGHT"  : DEFAULTS["COHESION_WEIGHT"]  * (1 + pct_range()),
 }
 
+# adaptive replication (--adaptive): target full width of the 95 % CI of
+# each metric's mean, and the total number of trials allowed for the sweep
+INITIAL_REPLICATES = 3
+TARGET_CI = dict(delta_front=5.0, delta_radial=2.0)
+REPLICATE_BUDGET = 600
+ROUND_MAX_EXTRA = 8         # most replicates one point gets per round
+
 # ------------------------------------------------------------------
 # experiment loop
 # ------------------------------------------------------------------
-out_dir = Path("results"); out_dir.mkdir(exist_ok=True)
-csv_file = out_dir/"experiment_metrics.csv"
-rows = []
+def sweep_plan(seeds=(SEED,)):
+    """All (param_name, value, seed) trials of the sweep."""
+    return [(param_name, value, seed)
+            for param_name, values in PARAM_RANGE.items()
+            for value in values for seed in seeds]
 
-for param_name, values in PARAM_RANGE.items():
-    for value in values:
-        pct_change = 100 * (value - DEFAULTS[param_name]) / DEFAULTS[param_name]
 
-        # Build a *controlled* parameter dict: only the tested
-        # parameter differs, everything else = default.
-        params = DEFAULTS.copy()
-        params[param_name] = value
+def report(row):
+    # design rows (design.py) carry a point id instead of a % change
+    where = (f"{row['pct_change']:6.0f}%" if "pct_change" in row
+             else f"#{row['param_value']:<6.0f}")
+    print(f"{row['param_name']:18s} {where}  "
+          f"ΔFront={row['delta_front']:+5.2f}  "
+          f"ΔRadial={row['delta_radial']:+5.2f}  "
+          f"[{row['stop_reason']} @ {row['n_steps']}]")
 
+
+def run_local(todo, run_meta):
+    """Run the trials one after another in this process."""
+    for param_name, value, seed in todo:
         # ---------------  RUN THE SIM  --------------------------
-        t0 = time.time()
-        d_front, d_radial = run_single_sim(params)     # returns the two metrics
-        dt = time.time() - t0
+        # Controlled comparison: only the tested parameter differs,
+        # everything else = default.  The row reaches the store before
+        # the registry marks it done, so an interrupt loses nothing.
+        row = run_trial(param_name, value, seed, run_meta=run_meta,
+                        warm_start=WARM_START)
         # --------------------------------------------------------
+        if row is None:
+            print(f"{param_name:18s} {value:10.4g}  FAILED (see registry)")
+            continue
+        report(row)
+
+
+def run_parallel(todo, run_meta, n_workers):
+    """
+    Run the trials on `n_workers` local processes, longest predicted
+    run time first (see scheduler.py), to cut the sweep's wall time.
+    """
+    conn = registry.connect()
+    history = registry.trial_table(conn, status=registry.DONE)
+    conn.close()
+    costs = predict_costs(todo, history)
+    ljf = np.sort(costs)[::-1]
+    print(f"predicted makespan: {estimate_makespan(ljf, n_workers):.1f} s "
+          f"longest‑first vs {estimate_makespan(costs, n_workers):.1f} s "
+          f"in plan order")
+
+    # every worker stores its row before marking the trial done, so an
+    # interrupted pool loses nothing that the registry will skip
+    trial_fn = functools.partial(run_trial, run_meta=run_meta,
+                                 warm_start=WARM_START)
+    for (param_name, value, _), row in run_longest_first(todo, trial_fn,
+                                                         costs, n_workers):
+        if row is None:
+            print(f"{param_name:18s} {value:10.4g}  FAILED (see registry)")
+            continue
+        report(row)
+
+
+def run_queued(todo, run_meta, queue_dir, poll_s=10.0, points=None,
+               warm_start=WARM_START):
+    """
+    Submit the trials to a shared `workqueue.DirectoryQueue` and collect
+    the results as workers (on any node) publish them.  With `points`
+    (point id → overrides, see design.py) the trials are design points.
+    """
+    queue = DirectoryQueue(queue_dir)
+    ids = {task_id(*t): t for t in todo}
+    tasks = []
+    for tid, (name, value, seed) in ids.items():
+        task = dict(id=tid, param_name=name, param_value=float(value),
+                    seed=int(seed), sim_kwargs=dict(warm_start=warm_start))
+        if points is not None:
+            task["overrides"] = points[int(value)]
+        tasks.append(task)
+    queue.submit(tasks)
+    print(f"submitted {len(ids)} trials to {queue_dir}")
+
+    conn = registry.connect()
+    collected = set()
+    while len(collected) < len(ids):
+        batch = []
+        for tid, res in queue.results().items():
+            if tid not in ids or tid in collected:
+                continue
+            collected.add(tid)
+            name, value, seed = ids[tid]
+            if res["status"] != "done":
+                registry.record_trial(conn, name, value, seed, registry.FAILED,
+                                      error=res.get("error"),
+                                      worker=res.get("worker"))
+                print(f"{name:18s} {value:10.4g}  FAILED on {res.get('worker')}")
+                continue
+            batch.append(res)
+            report(res["row"])
+        # store first, then mark done (see batch_sim.run_trial)
+        append_trials([res["row"] for res in batch], run_meta)
+        for res in batch:
+            register_row(conn, res["row"], worker=res["worker"])
+        if len(collected) < len(ids):
+            time.sleep(poll_s)
+    conn.close()
+
+
+def run_trials(todo, run_meta, queue=None, n_workers=1):
+    """Run `todo` on a shared queue, a local pool or in this process."""
+    if queue:
+        run_queued(todo, run_meta, queue)
+    elif n_workers > 1:
+        run_parallel(todo, run_meta, n_workers)
+    else:
+        run_local(todo, run_meta)
+
+
+# ------------------------------------------------------------------
+# adaptive replication
+# ------------------------------------------------------------------
+def replicate_ci(history, metrics=tuple(TARGET_CI), level=0.95):
+    """
+    Per sweep point (param_name, param_value): number of replicates, and
+    mean and full 95 % CI width (Student t) of every metric.  Points
+    with fewer than two replicates get an infinite width.
+    """
+    grouped = history.groupby(["param_name", "param_value"])
+    out = grouped.size().rename("n").to_frame()
+    n = out["n"].to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = student_t.ppf(0.5 + level / 2, n - 1)
+        for m in metrics:
+            stats = grouped[m].agg(["mean", "std"])
+            out[f"{m}_mean"] = stats["mean"]
+            width = 2 * t * stats["std"].to_numpy() / np.sqrt(n)
+            out[f"{m}_ci"] = np.where(n > 1, width, np.inf)
+    return out.reset_index()
+
+
+def allocate_replicates(ci, target=TARGET_CI, max_extra=ROUND_MAX_EXTRA):
+    """
+    Points whose CI is still wider than the target, most imprecise first
+    (by the worst ratio width / target over the metrics), as a list of
+    (param_name, param_value, extra).  The width shrinks like 1/√n, so a
+    point with n replicates and ratio r needs about n·(r² − 1) more;
+    `extra` is that, between 1 and `max_extra`.
+    """
+    score = np.max([ci[f"{m}_ci"] / tgt for m, tgt in target.items()], axis=0)
+    open_ = ci.assign(score=score).query("score > 1") \
+        .sort_values("score", ascending=False)
+    with np.errstate(over="ignore", invalid="ignore"):
+        need = np.ceil(open_["n"] * (open_["score"] ** 2 - 1))
+    extra = np.clip(np.nan_to_num(need, nan=max_extra, posinf=max_extra),
+                    1, max_extra).astype(int).tolist()
+    return list(zip(open_["param_name"], open_["param_value"], extra))
+
+
+def run_adaptive(run_meta, queue=None, n_workers=1,
+                 initial=INITIAL_REPLICATES, target=TARGET_CI,
+                 budget=REPLICATE_BUDGET):
+    """
+    Adaptive sweep: `initial` seeds per point, then every round one batch
+    with the predicted number of extra seeds for every point above the
+    `target` CI width (see `allocate_replicates`), until every point
+    meets it or the registry holds `budget` trials of the sweep.  Batches
+    do not depend on `n_workers`, so each round fills the pool and writes
+    one store file per partition.  Everything is resumable through the
+    registry.
+    """
+    if initial < 2:
+        raise ValueError("need at least two initial replicates for a CI")
+    points = {(name, registry.key_value(v)) for name, values in PARAM_RANGE.items()
+              for v in values}
+    todo = [(name, value, seed) for name, value in sorted(points)
+            for seed in range(SEED, SEED + initial)]
+
+    conn = registry.connect()
+    while True:
+        todo = registry.missing_trials(conn, todo)
+        if todo:
+            run_trials(todo, run_meta, queue, n_workers)
+
+        table = registry.trial_table(conn)
+        table = table[[(n, v) in points for n, v in
+                       zip(table["param_name"], table["param_value"])]]
+        ci = replicate_ci(table[table["status"] == registry.DONE])
+        wide = allocate_replicates(ci, target)
+        print(f"adaptive: {len(table)} trials, {len(wide)} of {len(ci)} "
+              f"points above the target CI")
+        # next unused seeds of each point (failed seeds are not retried)
+        last_seed = table.groupby(["param_name", "param_value"])["seed"].max()
+        todo = [(name, value, int(last_seed[name, value]) + 1 + k)
+                for name, value, extra in wide for k in range(extra)]
+        todo = todo[:max(0, budget - len(table))]
+        if not todo:
+            break
+    conn.close()
+    return ci
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--queue", help="shared queue directory for workqueue.py workers")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="local worker processes (longest trials first)")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="allocate replicates until TARGET_CI is met")
+    ap.add_argument("--budget", type=int, default=REPLICATE_BUDGET,
+                    help="total trials allowed in --adaptive mode")
+    args = ap.parse_args()
+
+    run_meta = new_run_metadata(seed=SEED, warm_start=WARM_START,
+                                n_boids=config.NUM_BOIDS, defaults=DEFAULTS)
+
+    if args.adaptive:
+        ci = run_adaptive(run_meta, args.queue, args.workers, budget=args.budget)
+        print(ci.to_string(index=False, float_format="%.2f"))
+        return
+
+    # only run what the registry does not list as done yet
+    conn = registry.connect()
+    plan = sweep_plan()
+    todo = registry.missing_trials(conn, plan)
+    conn.close()
+    print(f"{len(plan) - len(todo)} of {len(plan)} trials already done, "
+          f"running {len(todo)}")
 
-        rows.append(dict(param_name = param_name,
-                         param_value = value,
-                         pct_change = pct_change,
-                         delta_front = d_front,
-                         delta_radial = d_radial,
-                         run_time_s = dt))
+    run_trials(todo, run_meta, args.queue, args.workers)
 
-        print(f"{param_name:18s} {pct_change:6.0f}%  "
-              f"ΔFront={d_front:+5.2f}  ΔRadial={d_radial:+5.2f}")
 
-df = pd.DataFrame(rows)
-df.to_csv(csv_file, index=False)
-print("\nSaved CSV to", csv_file)
+if __name__ == "__main__":
+    main()
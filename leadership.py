@@ -0,0 +1,182 @@
+# leadership.py
+"""
+Leader–follower analysis from recorded trajectories.
+
+Following Nagy et al. (2010), the directional correlation of agents i
+and j at delay τ is
+
+    C_ij(τ) = < h_i(t) · h_j(t + τ) >_t
+
+with h the unit heading (velocity direction).  If C_ij peaks at τ* > 0,
+j copies i's heading τ* steps later: i leads j.  An agent's leadership
+score is its mean τ* over the pairs it is strongly correlated with
+(peak ≥ `min_corr`), which orders the flock into a hierarchy.
+
+All C_ij(τ) come from one FFT per agent and heading component; the
+cross‑correlation of a batch of pairs is a product of spectra and one
+inverse FFT, so all pairs over all lags take seconds where a loop over
+lags and pairs would take hours.
+
+    python leadership.py traj/s1 --max-lag 60 --radius 100
+
+reports whether the selected (informed) boids lead the others.
+"""
+
+import numpy as np
+from scipy.fft import rfft, irfft, next_fast_len
+from scipy.spatial import cKDTree
+from scipy.stats import mannwhitneyu
+from trajectories import read_meta, iter_chunks
+
+PAIR_BATCH = 2048       # pairs per inverse FFT
+
+
+def load_headings(path, start=0, stride=1):
+    """
+    Unit headings (T, n, 2) and positions (T, n, 2) of the steps
+    ``start, start + stride, …`` of a trajectory.  Every memory‑mapped
+    chunk is sliced before it is read, so only the selected steps are
+    loaded.
+    """
+    headings, positions = [], []
+    for step0, chunk in iter_chunks(path):
+        # first selected step at or after this chunk's first step
+        first = max(start, step0)
+        first += (start - first) % stride
+        frames = np.asarray(chunk[first - step0::stride])
+        if not len(frames):
+            continue
+        vel = frames[..., 2:].astype(float)
+        speed = np.linalg.norm(vel, axis=-1, keepdims=True)
+        headings.append(vel / np.where(speed > 0, speed, 1.0))
+        positions.append(frames[..., :2].astype(float))
+    if not headings:
+        n = read_meta(path)["n"]
+        return np.zeros((0, n, 2)), np.zeros((0, n, 2))
+    return np.concatenate(headings), np.concatenate(positions)
+
+
+def neighbour_pairs(positions, radius, every=10):
+    """Pairs (i < j) closer than `radius` in any of every `every`‑th frame."""
+    pairs = set()
+    for frame in positions[::every]:
+        pairs |= cKDTree(frame).query_pairs(radius)
+    return np.array(sorted(pairs), dtype=int).reshape(-1, 2)
+
+
+def lag_correlation(h, pairs, max_lag):
+    """
+    Directional correlation C_ij(τ) for τ = ‑max_lag … max_lag.
+
+    Parameters
+    ----------
+    h : np.ndarray, shape (T, n, 2)
+        Unit headings.
+    pairs : np.ndarray, shape (P, 2)
+        Agent index pairs (i, j).
+    max_lag : int
+        Largest delay in steps.
+
+    Returns
+    -------
+    lags : np.ndarray, shape (2·max_lag + 1,)
+    C : np.ndarray, shape (P, 2·max_lag + 1)
+        Mean of h_i(t)·h_j(t+τ) over the T − |τ| overlapping steps.
+    """
+    T = len(h)
+    max_lag = min(max_lag, T - 1)
+    nfft = next_fast_len(2 * T - 1)
+    spec = rfft(h, n=nfft, axis=0)                       # (F, n, 2)
+    lags = np.arange(-max_lag, max_lag + 1)
+    overlap = T - np.abs(lags)
+    C = np.empty((len(pairs), len(lags)))
+    for a in range(0, len(pairs), PAIR_BATCH):
+        i, j = pairs[a:a + PAIR_BATCH].T
+        cross = np.sum(np.conj(spec[:, i]) * spec[:, j], axis=-1)   # (F, b)
+        cc = irfft(cross, n=nfft, axis=0)                # cc[τ] = Σ h_i(t)·h_j(t+τ)
+        C[a:a + PAIR_BATCH] = (cc[lags % nfft] / overlap[:, None]).T
+    return lags, C
+
+
+def leadership(path, max_lag=60, min_corr=0.5, radius=None, settle=True, stride=1):
+    """
+    Leadership hierarchy of a recorded trajectory.
+
+    Parameters
+    ----------
+    path : str or Path
+        Trajectory directory (see trajectories.py).
+    max_lag : int
+        Largest delay considered, in recorded steps.
+    min_corr : float
+        Pairs whose correlation peak is below this are ignored.
+    radius : float or None
+        Only pairs that were ever this close (None = all pairs).
+    settle : bool
+        Skip the settling phase (the first ``settle_time`` seconds).
+    stride : int
+        Use every `stride`‑th step (lags are then in units of stride).
+
+    Returns
+    -------
+    dict
+        ``score`` (n,) mean τ* in steps (> 0: leads), ``pairs`` (P, 2),
+        ``tau`` (P,) delay of the peak, ``peak`` (P,) its correlation and
+        ``groups`` (n,).
+    """
+    meta = read_meta(path)
+    start = int(np.ceil(meta["settle_time"] / meta["dt"])) if settle else 0
+    h, pos = load_headings(path, start, stride)
+    n = h.shape[1]
+    if radius is None:
+        pairs = np.column_stack(np.triu_indices(n, 1))
+    else:
+        pairs = neighbour_pairs(pos, radius)
+    lags, C = lag_correlation(h, pairs, max_lag)
+    best = np.argmax(C, axis=1)
+    tau, peak = lags[best], C[np.arange(len(pairs)), best]
+
+    ok = peak >= min_corr
+    i, j, t = pairs[ok, 0], pairs[ok, 1], tau[ok]
+    # pair (i, j) with delay τ counts +τ for i and −τ for j
+    total = np.bincount(i, t, n) - np.bincount(j, t, n)
+    count = np.bincount(i, minlength=n) + np.bincount(j, minlength=n)
+    score = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    return dict(score=score, pairs=pairs, tau=tau, peak=peak,
+                groups=np.load(f"{path}/groups.npy"))
+
+
+def selected_lead(result):
+    """
+    Do the selected (group 0) agents lead?  Compares their leadership
+    scores with the others' (one‑sided Mann–Whitney U test).
+    """
+    score, groups = result["score"], result["groups"]
+    sel = score[(groups == 0) & ~np.isnan(score)]
+    rest = score[(groups != 0) & ~np.isnan(score)]
+    ranked = np.argsort(-np.nan_to_num(score, nan=-np.inf))
+    top = ranked[:max(1, len(sel))]
+    p = mannwhitneyu(sel, rest, alternative="greater").pvalue \
+        if len(sel) and len(rest) else np.nan
+    return dict(selected_mean=float(np.mean(sel)) if len(sel) else np.nan,
+                others_mean=float(np.mean(rest)) if len(rest) else np.nan,
+                selected_in_top=float(np.mean(groups[top] == 0)),
+                p_value=float(p))
+
+
+if __name__ == "__main__":
+    import argparse, time
+    ap = argparse.ArgumentParser(description="Do the selected boids lead?")
+    ap.add_argument("trajectory", nargs="+")
+    ap.add_argument("--max-lag", type=int, default=60, help="steps")
+    ap.add_argument("--min-corr", type=float, default=0.5)
+    ap.add_argument("--radius", type=float, help="only pairs ever this close")
+    args = ap.parse_args()
+    for path in args.trajectory:
+        t0 = time.perf_counter()
+        res = leadership(path, args.max_lag, args.min_corr, args.radius)
+        rep = selected_lead(res)
+        print(f"{path}: {len(res['pairs'])} pairs in {time.perf_counter() - t0:.2f} s  "
+              f"score selected {rep['selected_mean']:+.2f} vs others "
+              f"{rep['others_mean']:+.2f} steps, {100 * rep['selected_in_top']:.0f} % "
+              f"of the top ranks selected, p = {rep['p_value']:.3g}")
@@ -5,6 +5,7 @@ from directed_boids import DirectedBoid
 from viz import create_boids, draw_translucent_text, draw_walls, screen, clock
 import walls
 from number_inputs import draw_controllers, handle_controller_event, update_parameters
+from multiview import run_comparison
 import numpy as np
 
 def menu():
@@ -18,6 +19,7 @@ def menu():
             font.render("Press 1 for Basic Boids", True, (255, 255, 255)),
             font.render("Press 2 for Directed Boids", True, (255, 255, 255)),
             font.render("Press 3 for Heterogeneous Directed Boids", True, (255, 255, 255)),
+            font.render("Press 4 to Compare Parameter Sets", True, (255, 255, 255)),
             small_font.render(f"Walls: {'Visible' if walls.walls_visible else 'Hidden'} (Press W)", True, (255, 255, 255)),
             font.render("Press ESC/Q to Exit", True, (255, 255, 255))
         ]
@@ -40,6 +42,8 @@ def menu():
                     run_simulation(use_directed_boids=True)
                 elif event.key == pygame.K_3:
                     run_simulation(use_collective_memory=True)
+                elif event.key == pygame.K_4:
+                    run_comparison()
                 elif event.key == pygame.K_w:
                     walls.walls_visible = not walls.walls_visible
                 elif event.key in (pygame.K_ESCAPE, pygame.K_q):
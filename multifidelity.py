@@ -0,0 +1,171 @@
+# multifidelity.py
+"""
+Multi‑fidelity screening of the experiments.py sweep.
+
+Most sweep points barely move the selected group, and a full‑size trial
+is needed only to learn that.  Here every point is first run at *low
+fidelity* (LOW_FIDELITY: a small flock, short `max_steps`, coarse
+logging stride with the convergence rule's `min_log_steps` scaled to
+match) with a few seeds.  A handful of calibration points per
+parameter (its default value and the ends of its range) are run at full
+fidelity, and a linear map
+
+    high ≈ a + b · low
+
+is fitted per metric over all points known at both fidelities.  Every
+other point then gets a predicted full‑fidelity effect, b times its
+low‑fidelity difference to the parameter's default point, with an
+uncertainty from the fit residuals and the low‑fidelity seed spread,
+and is run at full fidelity only if that effect is large or uncertain,
+i.e. not confidently below EFFECT_MIN.  ``--budget N`` further caps the
+full‑fidelity runs at the N points with the largest upper bound
+``|effect| + Z·sd``.
+
+Low‑fidelity trials have their own registry and store under
+results/lofi; full‑fidelity ones go to the usual registry and store, so
+they are indistinguishable from a plain sweep.
+
+    python multifidelity.py --workers 8
+"""
+
+import functools
+from pathlib import Path
+import numpy as np
+import config
+from batch_sim import run_trial
+import registry
+from results_store import STORE_DIR, new_run_metadata
+from scheduler import run_longest_first
+from experiments import PARAM_RANGE, DEFAULTS, SEED, WARM_START, sweep_plan
+
+LOFI_DIR = Path("results") / "lofi"
+# min_log_steps counts logged steps, so it is scaled with the stride to
+# keep the convergence rule reachable within max_steps (the stall rule
+# counts plain steps and needs no scaling)
+LOW_LOG_EVERY = 5
+LOW_FIDELITY = dict(n_boids=config.NUM_BOIDS // 4, max_steps=1000,
+                    log_every=LOW_LOG_EVERY, min_log_steps=300 // LOW_LOG_EVERY)
+LOW_SEEDS = tuple(range(5))
+METRICS = ("delta_front", "delta_radial")
+
+# smallest effect worth a full‑fidelity run, and the z of its interval
+EFFECT_MIN = dict(delta_front=5.0, delta_radial=2.0)
+Z = 1.96
+
+
+def run_batch(plan, registry_path, store, n_workers=1, **sim_kwargs):
+    """Run the trials of `plan` not yet done in `registry_path`."""
+    conn = registry.connect(registry_path)
+    todo = registry.missing_trials(conn, plan)
+    conn.close()
+    if not todo:
+        return
+    # rows are stored one by one as trials finish (see batch_sim.run_trial)
+    fn = functools.partial(run_trial, registry_path=registry_path,
+                           run_meta=new_run_metadata(warm_start=WARM_START,
+                                                     **sim_kwargs),
+                           store=store, warm_start=WARM_START, **sim_kwargs)
+    for _ in run_longest_first(todo, fn, np.ones(len(todo)), n_workers):
+        pass
+
+
+def point_stats(registry_path, seeds=None):
+    """
+    Mean and standard error of every metric per (param_name,
+    param_value) over the DONE trials (optionally only `seeds`).
+    """
+    conn = registry.connect(registry_path)
+    table = registry.trial_table(conn, status=registry.DONE)
+    conn.close()
+    if seeds is not None:
+        table = table[table["seed"].isin(seeds)]
+    grouped = table.groupby(["param_name", "param_value"])[list(METRICS)]
+    sem = grouped.sem().fillna(0.0).add_suffix("_sem")
+    return grouped.mean().join(sem)
+
+
+def calibration_plan(seed=SEED):
+    """Default value and both ends of every parameter's range."""
+    return [(name, value, seed) for name, values in PARAM_RANGE.items()
+            for value in (values[0], DEFAULTS[name], values[-1])]
+
+
+def fit_fidelity_map(low, high, metric):
+    """
+    Least‑squares ``high = a + b * low`` of `metric` over the points
+    present in both tables; returns (a, b, residual sd, correlation).
+    """
+    both = low[[metric]].join(high[[metric]], lsuffix="_low", rsuffix="_high",
+                              how="inner").dropna()
+    x, y = both[f"{metric}_low"].to_numpy(), both[f"{metric}_high"].to_numpy()
+    if len(x) < 3:
+        raise ValueError(f"need at least three calibration points, got {len(x)}")
+    b, a = np.polyfit(x, y, 1)
+    resid_sd = np.sqrt(np.sum((y - (a + b * x)) ** 2) / (len(x) - 2))
+    return a, b, resid_sd, np.corrcoef(x, y)[0, 1]
+
+
+def screen(low, maps):
+    """
+    Predicted full‑fidelity effect of every low‑fidelity point.
+
+    The effect is the predicted difference to the parameter's default
+    point, ``b · (low − low_default)``; a point needs a full‑fidelity run
+    when ``|effect| + Z·sd > EFFECT_MIN`` for any metric; ``score`` is
+    the largest ratio of the two.
+    """
+    out = low.reset_index()
+    score = np.zeros(len(out))
+    for m in METRICS:
+        a, b, resid_sd, _ = maps[m]
+        ref = np.array([low.loc[(name, registry.key_value(DEFAULTS[name])), m]
+                        for name in out["param_name"]])
+        out[f"{m}_pred"] = a + b * out[m]
+        out[f"{m}_effect"] = b * (out[m] - ref)
+        out[f"{m}_sd"] = np.sqrt(resid_sd ** 2 + (b * out[f"{m}_sem"]) ** 2)
+        upper = (out[f"{m}_effect"].abs() + Z * out[f"{m}_sd"]) / EFFECT_MIN[m]
+        score = np.maximum(score, upper)
+    out["score"] = score                   # > 1: needs a full‑fidelity run
+    out["run_high"] = score > 1
+    return out
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--budget", type=int,
+                    help="at most this many full‑fidelity points after calibration")
+    args = ap.parse_args()
+    lofi_registry = LOFI_DIR / "registry.sqlite"
+
+    # 1. every point at low fidelity
+    run_batch(sweep_plan(LOW_SEEDS), lofi_registry, LOFI_DIR / "store",
+              args.workers, **LOW_FIDELITY)
+    # 2. calibration points at full fidelity
+    run_batch(calibration_plan(), registry.REGISTRY_PATH, STORE_DIR, args.workers)
+
+    low = point_stats(lofi_registry, LOW_SEEDS)
+    high = point_stats(registry.REGISTRY_PATH, [SEED])
+    maps = {m: fit_fidelity_map(low, high, m) for m in METRICS}
+    for m, (a, b, sd, r) in maps.items():
+        print(f"{m:13s} high ≈ {a:+.2f} + {b:.2f}·low   resid sd {sd:.2f}   r={r:.2f}")
+
+    # 3. full fidelity only where the effect is large or uncertain
+    table = screen(low, maps)
+    table.to_parquet(LOFI_DIR / "screen.parquet", index=False)
+    picks = table[table["run_high"]].sort_values("score", ascending=False)
+    if args.budget is not None:
+        picks = picks.head(args.budget)
+    plan = [(name, value, SEED) for name, value in
+            zip(picks["param_name"], picks["param_value"])]
+    run_batch(plan, registry.REGISTRY_PATH, STORE_DIR, args.workers)
+
+    n_high = len(set(plan) | set((n, registry.key_value(v), s)
+                                 for n, v, s in calibration_plan()))
+    print(f"full fidelity: {n_high} of {len(table)} points "
+          f"({len(table) - n_high} screened out)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# multiview.py
+"""
+Side‑by‑side comparison of several parameter sets in one window.
+
+Every viewport is an independent flock (same start positions, its own
+overrides for the selected boids), but all of them are stepped as *one*
+batched `engine.Flock`: the flocks are laid out next to each other in
+one wide world with gaps wider than any interaction radius, so they
+never see each other, and after every step each flock is wrapped back
+into its own tile.  Drawing writes every agent of every viewport into
+the screen's pixel array in one vectorised pass.
+
+Click anywhere in a viewport to send all flocks to the same relative
+goal; Esc returns to the menu.
+"""
+
+import pygame
+import numpy as np
+import config
+from engine import Flock
+from batch_sim import init_population
+from viz import draw_translucent_text, screen, clock
+
+# (label, overrides for the selected boids)
+COMPARISONS = [
+    ("baseline", {}),
+    ("speed +30 %", {"MAX_SPEED": config.MAX_SPEED * 1.3}),
+    ("speed -30 %", {"MAX_SPEED": config.MAX_SPEED * 0.7}),
+    ("cohesion x2", {"COHESION_WEIGHT": config.COHESION_WEIGHT * 2}),
+]
+
+TILE_GAP = 1000.0       # world units between flocks, > any neighbour radius
+SELECTED_COLOR = (255, 0, 0)
+OTHER_COLOR = (255, 255, 0)
+
+
+class Ensemble:
+    """
+    Several flocks of `n_boids` with different parameter sets, stepped
+    together as one `Flock`.
+
+    Parameters
+    ----------
+    param_sets : list[(str, dict)]
+        Label and selected‑boid overrides of every flock.
+    """
+
+    def __init__(self, param_sets, n_boids=config.NUM_BOIDS, seed=0):
+        self.labels = [label for label, _ in param_sets]
+        flocks = [init_population(overrides, n_boids, rng=seed)
+                  for _, overrides in param_sets]
+        self.k, self.n_boids = len(flocks), n_boids
+        # tile k occupies x ∈ [offset_k, offset_k + WIDTH]; the first tile
+        # starts at TILE_GAP so the engine's own wrap never triggers
+        offsets = TILE_GAP + np.arange(self.k) * (config.WIDTH + TILE_GAP)
+        self.tile = np.repeat(np.arange(self.k), n_boids)
+        self.offset = np.column_stack((offsets[self.tile], np.zeros(len(self.tile))))
+
+        names = [f"{label}:{g}" for label in self.labels for g in flocks[0].group_names]
+        group_ids = np.concatenate([f.group_id + i * len(f.group_names)
+                                    for i, f in enumerate(flocks)])
+        self.flock = Flock(np.concatenate([f.position for f in flocks]) + self.offset,
+                           group_ids, names,
+                           goal=np.concatenate([f.goal for f in flocks]) + self.offset,
+                           rng=seed)
+        self.flock.velocity = np.concatenate([f.velocity for f in flocks])
+        for name in self.flock.params:
+            self.flock.params[name] = np.concatenate([f.params[name] for f in flocks])
+        self.flock.width = offsets[-1] + config.WIDTH + TILE_GAP
+        self.selected = np.concatenate([f.group_mask("selected") for f in flocks])
+
+    def set_goal(self, goal):
+        """Send every flock to the same goal, in tile coordinates."""
+        self.flock.set_goal(np.asarray(goal, dtype=float) + self.offset)
+
+    def step(self):
+        self.flock.step()
+        # wrap each flock inside its own tile (Boid.update convention)
+        x = self.flock.position[:, 0] - self.offset[:, 0]
+        x[x < 0] = config.WIDTH
+        x[x > config.WIDTH] = 0
+        self.flock.position[:, 0] = x + self.offset[:, 0]
+
+    def local_positions(self):
+        """Positions in tile coordinates, shape (k · n_boids, 2)."""
+        return self.flock.position - self.offset
+
+
+def tile_layout(k, width=config.WIDTH, height=config.HEIGHT):
+    """Grid of `k` viewports: list of (x, y) origins and the scale."""
+    cols = int(np.ceil(np.sqrt(k)))
+    rows = int(np.ceil(k / cols))
+    scale = min(1 / cols, 1 / rows)
+    w, h = width * scale, height * scale
+    return [(int((i % cols) * w), int((i // cols) * h)) for i in range(k)], scale
+
+
+def draw_ensemble(surface, ensemble, origins, scale, dot=1):
+    """Plot every agent of every viewport into `surface` in one pass."""
+    origin = np.array(origins, dtype=float)[ensemble.tile]
+    pts = (ensemble.local_positions() * scale + origin).astype(int)
+    colors = np.where(ensemble.selected[:, None], SELECTED_COLOR, OTHER_COLOR)
+
+    d = np.arange(-dot, dot + 1)
+    dx, dy = [a.ravel() for a in np.meshgrid(d, d)]
+    xs = (pts[:, 0:1] + dx).ravel()
+    ys = (pts[:, 1:2] + dy).ravel()
+    cs = np.repeat(colors, len(dx), axis=0)
+    w, h = surface.get_size()
+    ok = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+    pixels = pygame.surfarray.pixels3d(surface)
+    pixels[xs[ok], ys[ok]] = cs[ok]
+    del pixels                              # unlock the surface
+
+
+def run_comparison(param_sets=COMPARISONS):
+    ensemble = Ensemble(param_sets)
+    origins, scale = tile_layout(ensemble.k)
+    tile_w, tile_h = config.WIDTH * scale, config.HEIGHT * scale
+    font = pygame.font.SysFont(None, 24)
+
+    running = True
+    while running:
+        screen.fill((0, 0, 0))
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                for x0, y0 in origins:
+                    if x0 <= event.pos[0] < x0 + tile_w and y0 <= event.pos[1] < y0 + tile_h:
+                        ensemble.set_goal(((event.pos[0] - x0) / scale,
+                                           (event.pos[1] - y0) / scale))
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                return
+
+        ensemble.step()
+        draw_ensemble(screen, ensemble, origins, scale)
+        for (x0, y0), label in zip(origins, ensemble.labels):
+            pygame.draw.rect(screen, (80, 80, 80), (x0, y0, tile_w, tile_h), 1)
+            screen.blit(font.render(label, True, (255, 255, 255)), (x0 + 8, y0 + 8))
+
+        draw_translucent_text(f"Press 'Esc' to go back   {clock.get_fps():.0f} fps",
+                              (10, config.HEIGHT - 24), (255, 255, 255), 128)
+        pygame.display.flip()
+        clock.tick(60)
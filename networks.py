@@ -0,0 +1,116 @@
+# networks.py
+"""
+Interaction networks of the flock.
+
+Every step `engine.Flock` knows which agents each agent interacted with;
+`Flock.neighbour_graph()` returns that as a ``scipy.sparse`` CSR matrix.
+`GraphWriter` streams the graphs of sampled steps into compressed
+``.npz`` batches (``run_single_sim(..., graphs=DIR, graph_every=10)``),
+`iter_graphs` reads them back, and `graph_metrics` computes network
+observables with sparse operations only, so they stay cheap at 10k+
+agents:
+
+    components          connected components (edge direction ignored)
+    largest_fraction    share of agents in the largest component
+    out_degree_*        neighbours per agent (mean / std / max)
+    in_degree_*         how often an agent is someone's neighbour
+    clustering          mean local clustering coefficient (undirected)
+    reciprocity         share of edges i→j with j→i
+"""
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+class GraphWriter:
+    """
+    Collect CSR graphs of sampled steps and write them in compressed
+    batches of `batch` graphs (``graphs-00000.npz``, …).
+    """
+
+    def __init__(self, path, batch=100):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.batch = batch
+        self._steps, self._indptr, self._indices = [], [], []
+        self._files = 0
+
+    def append(self, step, graph):
+        self._steps.append(step)
+        self._indptr.append(graph.indptr.astype(np.int64))
+        self._indices.append(graph.indices.astype(np.int32))
+        if len(self._steps) == self.batch:
+            self._flush()
+
+    def _flush(self):
+        if not self._steps:
+            return
+        np.savez_compressed(self.path / f"graphs-{self._files:05d}.npz",
+                            steps=np.array(self._steps),
+                            indptr=np.stack(self._indptr),
+                            nnz=np.array([len(i) for i in self._indices]),
+                            indices=np.concatenate(self._indices))
+        self._files += 1
+        self._steps, self._indptr, self._indices = [], [], []
+
+    def close(self):
+        self._flush()
+
+
+def iter_graphs(path):
+    """Yield (step, CSR adjacency) for every stored graph, in step order."""
+    for f in sorted(Path(path).glob("graphs-*.npz")):
+        with np.load(f) as data:
+            bounds = np.concatenate(([0], np.cumsum(data["nnz"])))
+            indices = data["indices"]
+            for k, step in enumerate(data["steps"]):
+                indptr = data["indptr"][k]
+                n = len(indptr) - 1
+                ind = indices[bounds[k]:bounds[k + 1]]
+                yield int(step), csr_matrix((np.ones(len(ind), dtype=np.int8),
+                                             ind, indptr), shape=(n, n))
+
+
+def clustering_coefficients(A):
+    """Local clustering coefficient of every node of the undirected graph."""
+    U = ((A + A.T) > 0).astype(np.int32)
+    U.setdiag(0)
+    U.eliminate_zeros()
+    deg = np.diff(U.indptr)
+    triangles = np.asarray((U @ U).multiply(U).sum(axis=1)).ravel() / 2
+    pairs = deg * (deg - 1) / 2
+    return np.divide(triangles, pairs, out=np.zeros(len(deg)), where=pairs > 0)
+
+
+def graph_metrics(A, clustering=True):
+    """
+    Network observables of one adjacency matrix (see module docstring).
+    The clustering coefficient is the only super‑linear part (a sparse
+    product A·A); ``clustering=False`` skips it.
+    """
+    A = csr_matrix(A, dtype=np.int8)
+    n = A.shape[0]
+    n_comp, labels = connected_components(A, directed=True, connection="weak")
+    out_deg = np.diff(A.indptr)
+    in_deg = np.bincount(A.indices, minlength=n)
+    local = clustering_coefficients(A) if clustering else np.full(n, np.nan)
+    mutual = A.multiply(A.T).nnz
+    return dict(components=int(n_comp),
+                largest_fraction=float(np.bincount(labels).max() / n) if n else np.nan,
+                out_degree_mean=float(out_deg.mean()),
+                out_degree_std=float(out_deg.std()),
+                out_degree_max=int(out_deg.max(initial=0)),
+                in_degree_mean=float(in_deg.mean()),
+                in_degree_std=float(in_deg.std()),
+                in_degree_max=int(in_deg.max(initial=0)),
+                clustering=float(local.mean()),
+                reciprocity=float(mutual / A.nnz) if A.nnz else np.nan)
+
+
+def metrics_table(path, clustering=True):
+    """`graph_metrics` of every stored graph, one row per step."""
+    return pd.DataFrame([dict(step=step, **graph_metrics(A, clustering))
+                         for step, A in iter_graphs(path)])
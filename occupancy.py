@@ -0,0 +1,105 @@
+# occupancy.py
+"""
+Streaming 2‑D occupancy histograms per agent group.
+
+An `OccupancyHistogram` has a fixed grid over a fixed extent, so its
+memory does not grow with the number of steps.  Every `add` turns the
+points into flattened (group, row, column) bin indices and accumulates
+them with one ``bincount``; points outside the extent are only counted.
+Histograms with the same grid `merge` by addition, so replicates and
+workers can be combined in any order.
+
+`run_single_sim(..., occupancy=PATH)` accumulates two of them for the
+selected and the non‑selected group and saves them with
+`save_histograms`:
+
+    world      positions in the world frame
+    comoving   (front, lateral) offsets from the flock centroid, front
+               along the centroid → goal axis as in ``delta_front``
+"""
+
+import numpy as np
+
+
+class OccupancyHistogram:
+    """
+    Parameters
+    ----------
+    extent : (x0, x1, y0, y1)
+        Area covered by the grid.
+    bins : (nx, ny)
+        Number of columns and rows.
+    n_groups : int
+        Groups are counted separately (group ids 0 … n_groups‑1).
+    """
+
+    def __init__(self, extent, bins=(64, 64), n_groups=2):
+        self.extent = tuple(float(e) for e in extent)
+        self.nx, self.ny = bins
+        self.n_groups = n_groups
+        self.counts = np.zeros((n_groups, self.ny, self.nx), dtype=np.int64)
+        self.outside = np.zeros(n_groups, dtype=np.int64)
+
+    def add(self, xy, groups):
+        """Count the points `xy` (M, 2) of agents in `groups` (M,)."""
+        x0, x1, y0, y1 = self.extent
+        groups = np.asarray(groups, dtype=np.intp)      # compact ids may be uint8
+        fx = (xy[:, 0] - x0) / (x1 - x0) * self.nx
+        fy = (xy[:, 1] - y0) / (y1 - y0) * self.ny
+        inside = (fx >= 0) & (fx < self.nx) & (fy >= 0) & (fy < self.ny)
+        flat = (groups[inside] * self.ny + fy[inside].astype(int)) * self.nx \
+            + fx[inside].astype(int)
+        self.counts += np.bincount(flat, minlength=self.counts.size) \
+            .reshape(self.counts.shape)
+        self.outside += np.bincount(groups[~inside], minlength=self.n_groups)
+
+    def merge(self, other):
+        """New histogram with the counts of both (same grid required)."""
+        if (self.extent, self.nx, self.ny, self.n_groups) != \
+                (other.extent, other.nx, other.ny, other.n_groups):
+            raise ValueError("can only merge histograms with the same grid")
+        out = OccupancyHistogram(self.extent, (self.nx, self.ny), self.n_groups)
+        out.counts = self.counts + other.counts
+        out.outside = self.outside + other.outside
+        return out
+
+    def density(self, group):
+        """Occupancy of `group` as a probability per bin (incl. outside)."""
+        total = self.counts[group].sum() + self.outside[group]
+        return self.counts[group] / total if total else self.counts[group] * 0.0
+
+
+def save_histograms(path, **hists):
+    """Save named histograms into one compressed ``.npz``."""
+    arrays = {}
+    for name, h in hists.items():
+        arrays[f"{name}_counts"] = h.counts
+        arrays[f"{name}_outside"] = h.outside
+        arrays[f"{name}_extent"] = np.array(h.extent)
+    np.savez_compressed(path, **arrays)
+
+
+def load_histograms(path):
+    """Inverse of `save_histograms`: dict name → OccupancyHistogram."""
+    hists = {}
+    with np.load(path) as data:
+        for key in data.files:
+            if key.endswith("_counts"):
+                name = key[:-len("_counts")]
+                counts = data[key]
+                h = OccupancyHistogram(data[f"{name}_extent"],
+                                       (counts.shape[2], counts.shape[1]),
+                                       counts.shape[0])
+                h.counts = counts
+                h.outside = data[f"{name}_outside"]
+                hists[name] = h
+    return hists
+
+
+def merge_files(paths):
+    """Merge the histograms of many trials (e.g. replicates) by name."""
+    total = {}
+    for path in paths:
+        for name, h in load_histograms(path).items():
+            total[name] = total[name].merge(h) if name in total else h
+    return total
@@ -0,0 +1,116 @@
+# precision.py
+"""
+Accuracy and cost of the compact single‑precision mode.
+
+``Flock(..., dtype=np.float32)`` (``run_single_sim(..., dtype=...)``)
+stores the agent state in float32 and group ids as uint8.  The flock is
+chaotic, so single and double precision trajectories drift apart after
+a few hundred steps however small the rounding; what has to agree are
+
+    * the short‑horizon trajectories (before the divergence grows), and
+    * the *distribution* of the trial metrics over seeds, which is what
+      every experiment in this repo reports.
+
+`short_horizon_error` and `metric_agreement` measure both, `state_bytes`
+and `step_time` the cost side.
+
+    python precision.py --seeds 20 --n-large 1000000
+"""
+
+import time
+import numpy as np
+import pandas as pd
+import config
+from engine import Flock
+from batch_sim import init_population, run_single_sim
+
+DTYPES = (np.float64, np.float32)
+
+
+def state_bytes(flock):
+    """Bytes of the per‑agent state arrays of `flock`."""
+    arrays = [flock.position, flock.velocity, flock.goal, flock.group_id,
+              flock.history, *flock.params.values()]
+    return sum(a.nbytes for a in arrays)
+
+
+def short_horizon_error(n_boids=config.NUM_BOIDS, steps=200, seed=0):
+    """
+    Run the same flock in both precisions from the same (rounded) start
+    and return the max position difference after every step.
+    """
+    start = init_population({}, n_boids, rng=seed).get_state()
+    start["position"] = start["position"].astype(np.float32).astype(float)
+    start["velocity"] = start["velocity"].astype(np.float32).astype(float)
+    flocks = [Flock.from_state(start, dtype) for dtype in DTYPES]
+    target = np.array([config.WIDTH * 0.8, config.HEIGHT * 0.8])
+    error = np.empty(steps)
+    for step in range(steps):
+        for f in flocks:
+            f.set_goal(target)
+            f.step()
+        error[step] = np.abs(flocks[0].position - flocks[1].position).max()
+    return error
+
+
+def metric_agreement(seeds=range(20), overrides=None, **sim_kwargs):
+    """
+    `run_single_sim` for every seed in both precisions.
+
+    Returns the per‑trial table and a summary per metric: mean of each
+    precision, their difference and its standard error, which should be
+    of the order of the standard error (|z| ≲ 2) if float32 is accurate
+    enough.
+    """
+    overrides = {} if overrides is None else overrides
+    rows = []
+    for seed in seeds:
+        for dtype in DTYPES:
+            front, radial, info = run_single_sim(overrides, seed=seed,
+                                                 dtype=dtype, **sim_kwargs)
+            rows.append(dict(seed=seed, dtype=np.dtype(dtype).name,
+                             delta_front=front, delta_radial=radial,
+                             n_steps=info["n_steps"]))
+    trials = pd.DataFrame(rows)
+    summary = []
+    for metric in ("delta_front", "delta_radial"):
+        wide = trials.pivot(index="seed", columns="dtype", values=metric)
+        a, b = wide["float64"], wide["float32"]
+        se = np.sqrt(a.var() / len(a) + b.var() / len(b))
+        summary.append(dict(metric=metric, float64=a.mean(), float32=b.mean(),
+                            diff=b.mean() - a.mean(), se=se,
+                            z=(b.mean() - a.mean()) / se if se > 0 else np.nan))
+    return trials, pd.DataFrame(summary)
+
+
+def step_time(n, dtype, steps=5, seed=0):
+    """Seconds per step and state bytes of an `n` agent flock in `dtype`."""
+    rng = np.random.default_rng(seed)
+    # default density: 100 agents per screen
+    side = np.sqrt(n / 100) * np.array([config.WIDTH, config.HEIGHT])
+    flock = Flock(rng.random((n, 2)) * side, rng.integers(0, 2, n),
+                  ("selected", "nonselected"), goal=side / 2, rng=seed, dtype=dtype)
+    flock.width, flock.height = side
+    flock.step()
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        flock.step()
+    return (time.perf_counter() - t0) / steps, state_bytes(flock)
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Validate the float32 state mode")
+    ap.add_argument("--seeds", type=int, default=20)
+    ap.add_argument("--n-large", type=int, default=1_000_000)
+    args = ap.parse_args()
+
+    err = short_horizon_error()
+    print("max |Δx| float32 vs float64 after "
+          + ", ".join(f"{s} steps: {err[s - 1]:.2e}" for s in (10, 50, 100, 200)))
+    _, summary = metric_agreement(range(args.seeds))
+    print(summary.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    for dtype in DTYPES:
+        sec, nbytes = step_time(args.n_large, dtype)
+        print(f"n={args.n_large}  {np.dtype(dtype).name}: {sec:.2f} s/step, "
+              f"state {nbytes / 2**20:.0f} MiB")
@@ -0,0 +1,157 @@
+# registry.py
+"""
+SQLite registry of sweep trials.
+
+One row per (param_name, param_value, seed) with its status, metrics,
+wall time and phase timings, so long campaigns can ask "what is done,
+what failed, how long did it take" without scanning result files, and
+experiments.py can plan only the missing work.
+
+The database runs in WAL mode with a busy timeout: many worker processes
+can insert concurrently (each write is one short transaction) while
+readers keep working.
+"""
+
+import json, os, socket, sqlite3, time
+from pathlib import Path
+import pandas as pd
+
+REGISTRY_PATH = Path("results") / "registry.sqlite"
+
+# trial lifecycle
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+# metrics that get their own column (everything else goes to `metrics`)
+METRIC_COLUMNS = ("delta_front", "delta_radial", "stop_reason", "n_steps")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    id           INTEGER PRIMARY KEY,
+    param_name   TEXT    NOT NULL,
+    param_value  REAL    NOT NULL,
+    seed         INTEGER NOT NULL,
+    status       TEXT    NOT NULL,
+    delta_front  REAL,
+    delta_radial REAL,
+    stop_reason  TEXT,
+    n_steps      INTEGER,
+    run_time_s   REAL,
+    phases       TEXT,              -- JSON {phase: seconds}
+    metrics      TEXT,              -- JSON of any further metrics
+    error        TEXT,
+    worker       TEXT,
+    started      REAL,
+    finished     REAL,
+    UNIQUE (param_name, param_value, seed)
+);
+CREATE INDEX IF NOT EXISTS idx_trials_name   ON trials (param_name);
+CREATE INDEX IF NOT EXISTS idx_trials_value  ON trials (param_value);
+CREATE INDEX IF NOT EXISTS idx_trials_seed   ON trials (seed);
+CREATE INDEX IF NOT EXISTS idx_trials_status ON trials (status);
+"""
+
+
+def key_value(value):
+    """Normalise a parameter value so sweeps that recompute it still match."""
+    return float(f"{float(value):.12g}")
+
+
+def connect(path=REGISTRY_PATH, timeout=60.0):
+    """Open (and if needed create) the registry in WAL mode."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=timeout, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def mark_running(conn, param_name, value, seed):
+    """Record that a trial has started (re‑running a failed one is fine)."""
+    conn.execute(
+        """INSERT INTO trials (param_name, param_value, seed, status, worker, started)
+           VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT (param_name, param_value, seed) DO UPDATE SET
+               status=excluded.status, worker=excluded.worker,
+               started=excluded.started, error=NULL""",
+        (param_name, key_value(value), int(seed), RUNNING, worker_name(),
+         time.time()))
+
+
+def record_trial(conn, param_name, value, seed, status, metrics=None,
+                 run_time_s=None, phases=None, error=None, worker=None):
+    """
+    Insert or update the row of one trial.
+
+    Parameters
+    ----------
+    status : str
+        One of PENDING, RUNNING, DONE, FAILED.
+    metrics : dict or None
+        Trial outputs; the keys in `METRIC_COLUMNS` get their own column,
+        the rest is stored as JSON.
+    run_time_s : float or None
+        Wall time of the trial.
+    phases : dict or None
+        Wall time per phase, e.g. ``{"init": 0.01, "step": 0.2}``.
+    error : str or None
+        Error message of a failed trial.
+    worker : str or None
+        Who ran the trial (default: this process, see `worker_name`),
+        e.g. the remote workqueue.py worker.
+    """
+    metrics = dict(metrics or {})
+    cols = {c: metrics.pop(c, None) for c in METRIC_COLUMNS}
+    if cols["n_steps"] is not None:
+        cols["n_steps"] = int(cols["n_steps"])
+    for c in ("delta_front", "delta_radial"):
+        if cols[c] is not None:
+            cols[c] = float(cols[c])
+    conn.execute(
+        """INSERT INTO trials (param_name, param_value, seed, status,
+                               delta_front, delta_radial, stop_reason, n_steps,
+                               run_time_s, phases, metrics, error, worker, finished)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT (param_name, param_value, seed) DO UPDATE SET
+               status=excluded.status, delta_front=excluded.delta_front,
+               delta_radial=excluded.delta_radial,
+               stop_reason=excluded.stop_reason, n_steps=excluded.n_steps,
+               run_time_s=excluded.run_time_s, phases=excluded.phases,
+               metrics=excluded.metrics, error=excluded.error,
+               worker=excluded.worker, finished=excluded.finished""",
+        (param_name, key_value(value), int(seed), status,
+         cols["delta_front"], cols["delta_radial"], cols["stop_reason"],
+         cols["n_steps"], run_time_s,
+         json.dumps(phases) if phases else None,
+         json.dumps(metrics, default=float) if metrics else None,
+         error, worker or worker_name(), time.time()))
+
+
+def missing_trials(conn, plan):
+    """
+    Return the entries of `plan` – an iterable of (param_name, value,
+    seed) – that are not DONE yet, in plan order.
+    """
+    done = {(name, value, seed) for name, value, seed in conn.execute(
+        "SELECT param_name, param_value, seed FROM trials WHERE status=?",
+        (DONE,))}
+    return [(name, value, seed) for name, value, seed in plan
+            if (name, key_value(value), int(seed)) not in done]
+
+
+def trial_table(conn, status=None, param_name=None):
+    """All (or the selected) registry rows as a DataFrame."""
+    query, args = "SELECT * FROM trials", []
+    where = []
+    if status is not None:
+        where.append("status=?"); args.append(status)
+    if param_name is not None:
+        where.append("param_name=?"); args.append(param_name)
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    return pd.read_sql_query(query, conn, params=args)
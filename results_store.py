@@ -0,0 +1,136 @@
+# results_store.py
+"""
+Columnar results store for sweep trials.
+
+Every call to `append_trials` writes one new Parquet file into a
+hive‑partitioned directory tree
+
+    results/store/param_name=MAX_SPEED/part-<run_id>-<uuid>.parquet
+
+so appends never rewrite existing data and parallel workers never write
+to the same file (each file is written under a temp name and renamed
+into place).  The run metadata travels in the Parquet schema metadata.
+
+Readers go through `read_trials`, which loads only the requested columns
+and partitions.
+"""
+
+import os, json, uuid, socket, time
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+
+STORE_DIR = Path("results") / "store"
+PARTITION = "param_name"
+
+
+def new_run_metadata(**extra):
+    """Metadata describing one sweep run (id, host, start time, …)."""
+    meta = dict(run_id=time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6],
+                host=socket.gethostname(),
+                pid=os.getpid(),
+                created=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    meta.update(extra)
+    return meta
+
+
+def append_trials(rows, run_meta, root=STORE_DIR):
+    """
+    Append a batch of trial rows to the store.
+
+    Parameters
+    ----------
+    rows : list[dict] or pd.DataFrame
+        One row per trial; must contain a ``param_name`` column.
+    run_meta : dict
+        From `new_run_metadata`; its ``run_id`` is also added as a column.
+    root : Path
+        Store directory.
+
+    Returns
+    -------
+    list[Path]
+        The files written (one per partition present in `rows`).
+    """
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return []
+    df["run_id"] = run_meta["run_id"]
+    written = []
+    for value, part in df.groupby(PARTITION, sort=False):
+        table = pa.Table.from_pandas(part.drop(columns=PARTITION),
+                                     preserve_index=False)
+        table = table.replace_schema_metadata(
+            {**(table.schema.metadata or {}),
+             b"run_meta": json.dumps(run_meta).encode()})
+        folder = Path(root) / f"{PARTITION}={value}"
+        folder.mkdir(parents=True, exist_ok=True)
+        name = f"part-{run_meta['run_id']}-{uuid.uuid4().hex}.parquet"
+        # readers skip dot‑files (see `data_files`), so a half‑written
+        # file is never seen
+        tmp = folder / ("." + name)
+        pq.write_table(table, tmp)
+        os.replace(tmp, folder / name)
+        written.append(folder / name)
+    return written
+
+
+def data_files(root=STORE_DIR, params=None):
+    """
+    Committed Parquet files of the store (all partitions or only
+    `params`).  In‑flight temp files (``.part-*``) and other dot /
+    underscore files are skipped, as pyarrow's own discovery does.
+    """
+    root = Path(root)
+    if params is None:
+        files = root.glob(f"{PARTITION}=*/*.parquet")
+    else:
+        files = (f for p in params
+                 for f in (root / f"{PARTITION}={p}").glob("*.parquet"))
+    return sorted(f for f in files if not f.name.startswith((".", "_")))
+
+
+def read_trials(root=STORE_DIR, columns=None, params=None, filter=None):
+    """
+    Load trials from the store.
+
+    Parameters
+    ----------
+    columns : list[str] or None
+        Columns to read (``None`` = all).  Only these are decoded.
+    params : list[str] or None
+        Restrict to these ``param_name`` partitions; the other
+        directories are not even opened.
+    filter : pyarrow.compute.Expression or None
+        Extra row filter, e.g. ``ds.field("seed") == 0``.
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    root = Path(root)
+    files = data_files(root, params)
+    if not files:
+        return pd.DataFrame(columns=columns)
+    # partitions may carry different columns (e.g. multi‑parameter designs),
+    # so use the union of the selected files' schemas
+    schema = pa.unify_schemas([pq.read_schema(f).remove_metadata() for f in files])
+    schema = schema.append(pa.field(PARTITION, pa.string()))
+    dataset = ds.dataset([str(f) for f in files], schema=schema, format="parquet",
+                         partitioning=ds.partitioning(
+                             pa.schema([(PARTITION, pa.string())]), flavor="hive"),
+                         partition_base_dir=str(root))
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
+
+
+def run_metadata(root=STORE_DIR):
+    """Return the metadata of every run found in the store, by run_id."""
+    runs = {}
+    for path in data_files(root):
+        raw = pq.read_schema(path).metadata or {}
+        if b"run_meta" in raw:
+            meta = json.loads(raw[b"run_meta"])
+            runs[meta["run_id"]] = meta
+    return runs
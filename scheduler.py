@@ -0,0 +1,116 @@
+# scheduler.py
+"""
+Longest‑job‑first dispatch of sweep trials over a process pool.
+
+Trial durations vary a lot with the parameters (slow boids take much
+longer to reach the goal), so handing trials out in plan order leaves a
+long tail of stragglers at the end of a sweep.  Here every trial gets a
+predicted cost from the `run_time_s` history in the registry, and trials
+are handed out longest first (LPT list scheduling): an idle worker
+always pulls the longest remaining trial from one shared queue, so no
+core idles while work is left and the short trials fill the gaps at the
+end.
+
+Costs of (param_name, value) pairs never run before come from a
+per‑parameter power‑law fit ``time ≈ a · value^b`` (e.g. b ≈ ‑1 for
+MAX_SPEED), falling back to the parameter's or the global median.
+"""
+
+import heapq
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from registry import key_value
+
+DEFAULT_COST = 1.0          # seconds, when there is no history at all
+
+
+def fit_cost_model(history):
+    """
+    Fit the fallback cost model from finished trials.
+
+    Parameters
+    ----------
+    history : pd.DataFrame
+        Registry rows with ``param_name``, ``param_value``, ``run_time_s``.
+
+    Returns
+    -------
+    dict
+        param_name → (a, b) of ``time = a * value**b``, or a constant
+        (float) if a fit is not possible; key ``None`` holds the global
+        median.
+    """
+    model = {None: float(history["run_time_s"].median())
+             if len(history) else DEFAULT_COST}
+    for name, sub in history.groupby("param_name"):
+        x = sub["param_value"].to_numpy(float)
+        y = sub["run_time_s"].to_numpy(float)
+        ok = (x > 0) & (y > 0)
+        if len(np.unique(x[ok])) >= 2:
+            b, log_a = np.polyfit(np.log(x[ok]), np.log(y[ok]), 1)
+            model[name] = (float(np.exp(log_a)), float(b))
+        else:
+            model[name] = float(np.median(y))
+    return model
+
+
+def predict_costs(plan, history):
+    """
+    Predicted run time of every (param_name, value, seed) in `plan`:
+    the median observed time of that (name, value) if it was run before,
+    the fitted model otherwise.
+    """
+    history = history.dropna(subset=["run_time_s"])
+    model = fit_cost_model(history)
+    observed = history.groupby(["param_name", "param_value"])["run_time_s"] \
+        .median().to_dict()
+    costs = []
+    for name, value, _ in plan:
+        key = (name, key_value(value))
+        fit = model.get(name, model[None])
+        if key in observed:
+            cost = observed[key]
+        elif isinstance(fit, tuple):
+            cost = fit[0] * value ** fit[1] if value > 0 else model[None]
+        else:
+            cost = fit
+        costs.append(cost)
+    return np.array(costs, dtype=float)
+
+
+def longest_first(plan, costs):
+    """`plan` reordered by decreasing predicted cost."""
+    order = np.argsort(-np.asarray(costs), kind="stable")
+    return [plan[i] for i in order]
+
+
+def estimate_makespan(costs, n_workers):
+    """Makespan of greedy list scheduling of `costs` (in the given order)."""
+    finish = [0.0] * n_workers
+    for c in costs:
+        heapq.heapreplace(finish, finish[0] + c)
+    return max(finish)
+
+
+def run_longest_first(plan, fn, costs, n_workers):
+    """
+    Run ``fn(*trial)`` for every trial of `plan` on `n_workers` processes,
+    longest predicted cost first.
+
+    Only `n_workers` trials are in flight at any time; whenever one
+    finishes the next longest is submitted, so the order is respected
+    exactly and idle workers immediately take over remaining work.
+
+    Yields ``(trial, result)`` as trials complete.
+    """
+    queue = longest_first(plan, costs)
+    queue.reverse()                     # pop() from the end = longest
+    with ProcessPoolExecutor(n_workers) as pool:
+        running = {}
+        while queue or running:
+            while queue and len(running) < n_workers:
+                trial = queue.pop()
+                running[pool.submit(fn, *trial)] = trial
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield running.pop(fut), fut.result()
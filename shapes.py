@@ -0,0 +1,51 @@
+# shapes.py
+"""
+Target point sets for the engine's shape‑forming mode
+(``engine.Flock(interaction="shape", shape=...)``).
+"""
+
+import numpy as np
+import config
+
+
+def text_points(text, centre=(config.WIDTH / 2, config.HEIGHT / 2),
+                height=200.0, spacing=4.0):
+    """
+    Rasterise `text` into a dense grid of points inside the glyphs.
+
+    Parameters
+    ----------
+    text : str
+        Text to render (Matplotlib's default font).
+    centre : (float, float)
+        Screen position of the centre of the text.
+    height : float
+        Approximate glyph height in pixels.
+    spacing : float
+        Grid spacing of the target points in pixels.
+
+    Returns
+    -------
+    np.ndarray, shape (P, 2)
+    """
+    from matplotlib.textpath import TextPath    # only needed here
+
+    path = TextPath((0, 0), text, size=height)
+    (x0, y0), (x1, y1) = path.get_extents().get_points()
+    xs, ys = np.meshgrid(np.arange(x0, x1, spacing), np.arange(y0, y1, spacing))
+    grid = np.column_stack((xs.ravel(), ys.ravel()))
+    inside = grid[path.contains_points(grid)]
+
+    # text coordinates have y pointing up, the screen has it pointing down
+    inside -= [(x0 + x1) / 2, (y0 + y1) / 2]
+    inside[:, 1] *= -1
+    return inside + np.asarray(centre, dtype=float)
+
+
+def ring_points(centre=(config.WIDTH / 2, config.HEIGHT / 2), radius=200.0,
+                spacing=4.0):
+    """Evenly spaced points on a circle."""
+    n = max(3, int(2 * np.pi * radius / spacing))
+    angle = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return np.asarray(centre, dtype=float) \
+        + radius * np.column_stack((np.cos(angle), np.sin(angle)))
@@ -0,0 +1,257 @@
+# trajectories.py
+"""
+Recorded trajectories and out‑of‑core analytics over them.
+
+A trajectory is a directory
+
+    meta.json           n, dt, target, settle_time, log_every, dtype, …
+    groups.npy          group id per agent (0 = selected)
+    chunk-00000.npy     float array (steps, n, 4): x, y, vx, vy
+    chunk-00001.npy     …
+
+written by `TrajectoryWriter` (``run_single_sim(..., record=path)``).
+Chunks are opened with memory mapping, so a trajectory never has to fit
+in RAM.
+
+Analytics are *reducers* with a mergeable partial state:
+
+    state = r.init()
+    state = r.update(state, chunk, step0)     # one chunk, steps step0…
+    state = r.merge(state_a, state_b)         # chunks / files in any order
+    result = r.finalize(state)
+
+`reduce_trajectories` maps the reducers over every chunk of every file
+(optionally on a process pool) and merges the partial states.
+`FrontRadial` reproduces the inline ``delta_front`` / ``delta_radial``
+of `batch_sim.run_single_sim` (up to floating‑point summation order).
+"""
+
+import json
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.spatial import cKDTree
+from occupancy import OccupancyHistogram
+
+
+# ---------------------------------------------------------------------
+# recording
+# ---------------------------------------------------------------------
+class TrajectoryWriter:
+    """
+    Append simulation steps to a trajectory directory, one ``.npy``
+    chunk per `chunk_steps` steps, so memory use stays bounded.
+    """
+
+    def __init__(self, path, group_id, chunk_steps=500, dtype=np.float64, **meta):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.n = len(group_id)
+        self.chunk_steps = chunk_steps
+        self.dtype = np.dtype(dtype)
+        self.meta = dict(meta, n=self.n, dtype=self.dtype.str,
+                         chunk_steps=chunk_steps)
+        np.save(self.path / "groups.npy", np.asarray(group_id))
+        self._buf = np.empty((chunk_steps, self.n, 4), dtype=self.dtype)
+        self._fill = 0
+        self._chunks = 0
+
+    def append(self, position, velocity):
+        self._buf[self._fill, :, :2] = position
+        self._buf[self._fill, :, 2:] = velocity
+        self._fill += 1
+        if self._fill == self.chunk_steps:
+            self._flush()
+
+    def _flush(self):
+        if self._fill:
+            np.save(self.path / f"chunk-{self._chunks:05d}.npy",
+                    self._buf[:self._fill])
+            self._chunks += 1
+            self._fill = 0
+
+    def close(self, **meta):
+        """Write the last chunk and meta.json (with any extra `meta`)."""
+        self._flush()
+        self.meta.update(meta, n_chunks=self._chunks)
+        (self.path / "meta.json").write_text(json.dumps(self.meta, default=float))
+
+
+def read_meta(path):
+    return json.loads((Path(path) / "meta.json").read_text())
+
+
+def iter_chunks(path):
+    """Yield (step0, chunk) for a trajectory; chunks are memory‑mapped."""
+    step0 = 0
+    for f in sorted(Path(path).glob("chunk-*.npy")):
+        chunk = np.load(f, mmap_mode="r")
+        yield step0, chunk
+        step0 += len(chunk)
+
+
+# ---------------------------------------------------------------------
+# reducers
+# ---------------------------------------------------------------------
+class FrontRadial:
+    """
+    Mean front/back and radial offset of the selected group relative to
+    the flock centroid, along the centroid → target axis – the
+    ``delta_front`` / ``delta_radial`` of `run_single_sim`.
+
+    State: (sum of per‑step front means, sum of radial means, steps).
+    """
+
+    def __init__(self, meta, groups):
+        self.target = np.asarray(meta["target"], dtype=float)
+        self.dt, self.settle_time = meta["dt"], meta["settle_time"]
+        self.log_every = meta.get("log_every", 1)
+        self.selected = np.asarray(groups) == 0
+
+    def init(self):
+        return np.zeros(3)
+
+    def update(self, state, chunk, step0):
+        steps = step0 + np.arange(len(chunk))
+        keep = (steps * self.dt >= self.settle_time) & (steps % self.log_every == 0)
+        if not keep.any():
+            return state
+        pos = np.asarray(chunk[keep, :, :2], dtype=float)       # (s, n, 2)
+        centroid = pos.mean(axis=1)
+        forward = self.target - centroid
+        norm = np.linalg.norm(forward, axis=1)
+        forward = np.where(norm[:, None] < 1e-5, [0.0, 1.0],
+                           forward / np.maximum(norm, 1e-300)[:, None])
+        rel = pos[:, self.selected] - centroid[:, None]
+        front = np.einsum("snk,sk->sn", rel, forward)
+        radial = np.linalg.norm(rel - front[..., None] * forward[:, None], axis=2)
+        return state + [front.mean(axis=1).sum(), radial.mean(axis=1).sum(),
+                        keep.sum()]
+
+    def merge(self, a, b):
+        return a + b
+
+    def finalize(self, state):
+        if not state[2]:
+            return dict(delta_front=np.nan, delta_radial=np.nan)
+        return dict(delta_front=state[0] / state[2],
+                    delta_radial=state[1] / state[2])
+
+
+class Occupancy:
+    """
+    2‑D occupancy histogram (world frame) per group, see
+    `occupancy.OccupancyHistogram`.  State: the histogram.
+    """
+
+    def __init__(self, meta, groups, bins=(64, 48)):
+        self.bins = bins
+        self.extent = (0, meta["world"][0], 0, meta["world"][1])
+        self.groups = np.asarray(groups)
+        self.n_groups = int(self.groups.max()) + 1
+
+    def init(self):
+        return OccupancyHistogram(self.extent, self.bins, self.n_groups)
+
+    def update(self, state, chunk, step0):
+        pos = np.asarray(chunk[:, :, :2]).reshape(-1, 2)
+        state.add(pos, np.tile(self.groups, len(chunk)))
+        return state
+
+    def merge(self, a, b):
+        return a.merge(b)
+
+    def finalize(self, state):
+        return state
+
+
+class NearestNeighbour:
+    """
+    Nearest‑neighbour distance statistics over all steps: mean and a
+    histogram with bins `edges`.  State: (histogram, sum, count).
+    """
+
+    def __init__(self, meta, groups, edges=np.linspace(0, 100, 51)):
+        self.edges = np.asarray(edges, dtype=float)
+
+    def init(self):
+        return (np.zeros(len(self.edges) - 1, dtype=np.int64), 0.0, 0)
+
+    def update(self, state, chunk, step0):
+        hist, total, count = state
+        for frame in chunk:
+            d, _ = cKDTree(np.asarray(frame[:, :2])).query(frame[:, :2], k=2)
+            nn = d[:, 1]
+            hist = hist + np.histogram(nn, self.edges)[0]
+            total += nn.sum()
+            count += len(nn)
+        return hist, total, count
+
+    def merge(self, a, b):
+        return a[0] + b[0], a[1] + b[1], a[2] + b[2]
+
+    def finalize(self, state):
+        hist, total, count = state
+        return dict(mean=total / count if count else np.nan, hist=hist,
+                    edges=self.edges)
+
+
+# ---------------------------------------------------------------------
+# chunked reduction
+# ---------------------------------------------------------------------
+def _make(meta, groups, specs):
+    return [cls(meta, groups, **kw) for cls, kw in specs]
+
+
+def _reduce_chunk(meta, groups, file, step0, specs):
+    """Partial states of every reducer over one chunk file."""
+    chunk = np.load(file, mmap_mode="r")
+    return [r.update(r.init(), chunk, step0) for r in _make(meta, groups, specs)]
+
+
+def reduce_trajectories(paths, specs, n_workers=1):
+    """
+    Apply reducers to every chunk of every trajectory in `paths` and
+    merge the partial states.
+
+    Parameters
+    ----------
+    paths : list[str or Path]
+        Trajectory directories.
+    specs : list[(class, dict)]
+        Reducer classes and their keyword arguments, e.g.
+        ``[(FrontRadial, {}), (Occupancy, dict(bins=(32, 24)))]``.
+    n_workers : int
+        Chunks are reduced on this many processes (1 = in‑process,
+        streaming one chunk at a time).
+
+    Returns
+    -------
+    dict
+        path → list of finalized results (one per spec).
+    """
+    # meta, groups and the chunk list are read once per trajectory
+    inputs = {}
+    jobs = []
+    for p in map(str, paths):
+        meta = read_meta(p)
+        groups = np.load(Path(p) / "groups.npy")
+        inputs[p] = (meta, groups)
+        for i, f in enumerate(sorted(Path(p).glob("chunk-*.npy"))):
+            jobs.append((p, meta, groups, str(f), i * meta["chunk_steps"]))
+    if n_workers > 1 and jobs:
+        with ProcessPoolExecutor(n_workers) as pool:
+            parts = list(pool.map(_reduce_chunk, *list(zip(*jobs))[1:],
+                                  [specs] * len(jobs)))
+    else:
+        parts = [_reduce_chunk(*job[1:], specs) for job in jobs]
+
+    out = {}
+    for p in map(str, paths):
+        reducers = _make(*inputs[p], specs)
+        states = [r.init() for r in reducers]
+        for job, part in zip(jobs, parts):
+            if job[0] == p:
+                states = [r.merge(s, x) for r, s, x in zip(reducers, states, part)]
+        out[p] = [r.finalize(s) for r, s in zip(reducers, states)]
+    return out
@@ -0,0 +1,278 @@
+# workqueue.py
+"""
+Lease‑based work queue for sweep trials, shared by several machines.
+
+The broker is just a directory on a shared filesystem:
+
+    <root>/tasks/<id>.json          task description (written once)
+    <root>/leases/<id>.<gen>.json   lease generation `gen` of a task
+    <root>/results/<id>.json        final result (written once)
+
+A worker claims a task by atomically *creating* the next lease
+generation file (O_EXCL), so two workers can never hold the same
+generation.  While it runs the trial it renews the lease expiry
+(heartbeat).  If a worker dies its lease expires and the next claim
+creates generation gen+1, i.e. the trial is retried.  Results are
+published with an atomic hard link, so only the first submission for a
+task is kept and a late duplicate is ignored: a killed worker never
+loses a trial and a slow one never duplicates it.  Submitting a task
+again whose result is ``failed`` clears that result and its leases, so
+a failed trial can be retried.
+
+Lease expiry uses wall‑clock time, so the clocks of the nodes must be
+roughly in sync (well below `lease_s`).
+
+`WorkQueue` is the abstract broker interface; `DirectoryQueue` is the
+implementation used in production, and a stand‑in subclass can be
+passed to `run_worker` in tests.  Tasks are one‑at‑a‑time sweep trials
+(experiments.py) or, with an ``overrides`` key, design points
+(design.py --queue).
+
+Start a worker on every node with
+
+    python workqueue.py /shared/sweep_queue
+"""
+
+import os, json, time, uuid, socket, hashlib, threading, traceback
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+
+def task_id(param_name, value, seed):
+    """Deterministic id, so re‑submitting the same trial is a no‑op."""
+    raw = json.dumps([param_name, float(f"{float(value):.12g}"), int(seed)])
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+class WorkQueue(ABC):
+    """Broker interface used by `run_worker` and experiments.py."""
+
+    @abstractmethod
+    def submit(self, tasks):
+        """
+        Add task dicts (with an ``id`` key); existing ids are kept, but a
+        task whose result is ``failed`` is reset so it runs again.
+        """
+
+    @abstractmethod
+    def claim(self, worker, lease_s):
+        """Lease one runnable task for `worker`; return (task, lease) or None."""
+
+    @abstractmethod
+    def heartbeat(self, lease, lease_s):
+        """Extend `lease`; return False if it has been taken over."""
+
+    @abstractmethod
+    def complete(self, lease, result):
+        """Publish the result of a leased task; False if one already exists."""
+
+    @abstractmethod
+    def results(self):
+        """Dict id → result of every finished task."""
+
+    @abstractmethod
+    def pending(self):
+        """Number of submitted tasks without a result."""
+
+
+class DirectoryQueue(WorkQueue):
+    """
+    `WorkQueue` on a (shared) directory, see the module docstring.
+
+    Parameters
+    ----------
+    root : str or Path
+        Queue directory, created if missing.
+    max_attempts : int
+        After this many expired leases a task is given up and gets a
+        ``{"status": "failed"}`` result.
+    """
+
+    def __init__(self, root, max_attempts=3):
+        self.root = Path(root)
+        self.max_attempts = max_attempts
+        for sub in ("tasks", "leases", "results"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+
+    # -- helpers -------------------------------------------------------
+    def _write_once(self, path, payload):
+        """Create `path` with `payload` unless it exists; True if we did."""
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        tmp.write_text(json.dumps(payload))
+        try:
+            os.link(tmp, path)          # atomic, fails if path exists
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            tmp.unlink()
+
+    def _read(self, path):
+        try:
+            return json.loads(path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None                 # vanished / being replaced
+
+    def _latest_lease(self, tid):
+        gens = [int(p.name.split(".")[1])
+                for p in (self.root / "leases").glob(f"{tid}.*.json")]
+        return max(gens, default=0)
+
+    def _lease_path(self, tid, gen):
+        return self.root / "leases" / f"{tid}.{gen}.json"
+
+    # -- interface -----------------------------------------------------
+    def _reset_failed(self, tid):
+        """Forget the failed result and the leases of `tid`; True if it had failed."""
+        path = self.root / "results" / f"{tid}.json"
+        res = self._read(path)
+        if res is None or res.get("status") != "failed":
+            return False
+        for lease in (self.root / "leases").glob(f"{tid}.*.json"):
+            lease.unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+        return True
+
+    def submit(self, tasks):
+        added = 0
+        for task in tasks:
+            # ids are deterministic and results write‑once, so a failed
+            # trial could otherwise never run again
+            added += (self._write_once(self.root / "tasks" / f"{task['id']}.json",
+                                       task)
+                      or self._reset_failed(task["id"]))
+        return added
+
+    def claim(self, worker, lease_s):
+        done = {p.stem for p in (self.root / "results").glob("*.json")}
+        now = time.time()
+        for path in sorted((self.root / "tasks").glob("*.json")):
+            tid = path.stem
+            if tid in done:
+                continue
+            gen = self._latest_lease(tid)
+            if gen:
+                lease = self._read(self._lease_path(tid, gen))
+                if lease is None or lease["expires"] > now:
+                    continue            # someone is working on it
+                if gen >= self.max_attempts:
+                    self._write_once(self.root / "results" / f"{tid}.json",
+                                     dict(id=tid, status="failed",
+                                          error=f"lease expired {gen} times"))
+                    continue
+            lease = dict(id=tid, gen=gen + 1, worker=worker,
+                         expires=now + lease_s)
+            # only one worker can create generation gen+1
+            if self._write_once(self._lease_path(tid, gen + 1), lease):
+                return self._read(path), lease
+        return None
+
+    def heartbeat(self, lease, lease_s):
+        if self._latest_lease(lease["id"]) != lease["gen"]:
+            return False                # expired and re‑leased meanwhile
+        lease["expires"] = time.time() + lease_s
+        path = self._lease_path(lease["id"], lease["gen"])
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+        tmp.write_text(json.dumps(lease))
+        os.replace(tmp, path)           # only the owner writes this file
+        return True
+
+    def complete(self, lease, result):
+        return self._write_once(self.root / "results" / f"{lease['id']}.json",
+                                dict(result, id=lease["id"]))
+
+    def results(self):
+        out = {}
+        for path in (self.root / "results").glob("*.json"):
+            res = self._read(path)
+            if res is not None:
+                out[path.stem] = res
+        return out
+
+    def pending(self):
+        tasks = {p.stem for p in (self.root / "tasks").glob("*.json")}
+        done = {p.stem for p in (self.root / "results").glob("*.json")}
+        return len(tasks - done)
+
+
+# ---------------------------------------------------------------------
+# worker
+# ---------------------------------------------------------------------
+def execute_task(task):
+    """
+    Default task runner: one `batch_sim` trial → result row, a
+    `design_row` if the task carries the ``overrides`` of a design point.
+    """
+    from batch_sim import trial_row, design_row   # heavy import, workers only
+    if "overrides" in task:                        # multi‑parameter design point
+        return design_row(task["param_name"], task["param_value"], task["seed"],
+                          task["overrides"], **task.get("sim_kwargs", {}))
+    return trial_row(task["param_name"], task["param_value"], task["seed"],
+                     **task.get("sim_kwargs", {}))
+
+
+def run_worker(queue, worker=None, lease_s=120.0, heartbeat_s=20.0,
+               poll_s=5.0, idle_exit=True, task_fn=execute_task):
+    """
+    Pull and run tasks from `queue` until it is empty.
+
+    Parameters
+    ----------
+    queue : WorkQueue
+        Broker (a `DirectoryQueue`, or a stand‑in in tests).
+    worker : str or None
+        Worker name (default host:pid).
+    lease_s, heartbeat_s : float
+        Lease length, and how often a running task renews it.
+    poll_s : float
+        Sleep between claims when nothing is runnable.
+    idle_exit : bool
+        Return once no task is pending at all (otherwise keep polling).
+    task_fn : callable
+        Runs one task dict and returns a JSON‑serialisable result dict.
+
+    Returns
+    -------
+    int
+        Number of results this worker published.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    published = 0
+    while True:
+        claimed = queue.claim(worker, lease_s)
+        if claimed is None:
+            if idle_exit and queue.pending() == 0:
+                return published
+            time.sleep(poll_s)
+            continue
+        task, lease = claimed
+
+        stop = threading.Event()
+        def beat():
+            while not stop.wait(heartbeat_s):
+                if not queue.heartbeat(lease, lease_s):
+                    return
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        try:
+            result = dict(status="done", worker=worker, row=task_fn(task))
+        except Exception:
+            result = dict(status="failed", worker=worker,
+                          error=traceback.format_exc())
+        finally:
+            stop.set()
+            beater.join()
+        published += queue.complete(lease, result)
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Run sweep trials from a shared queue.")
+    ap.add_argument("queue_dir")
+    ap.add_argument("--lease", type=float, default=120.0)
+    ap.add_argument("--stay", action="store_true",
+                    help="keep polling when the queue is empty")
+    args = ap.parse_args()
+    n = run_worker(DirectoryQueue(args.queue_dir), lease_s=args.lease,
+                   idle_exit=not args.stay)
+    print(f"worker finished, {n} results published")